@@ -0,0 +1,74 @@
+"""
+Benchmark: all-pairs vs candidate-indexed deduplication.
+
+    python -m benchmarks.dedupe [--records 50000] [--seed 42] [--workers 1,2,4]
+
+Runs both strategies on the same synthetic records, checks the outputs are
+identical, and prints timings and the speedup. With --workers, instead
+times the indexed path with each number of dedupe processes and checks
+every run matches the first.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import time
+
+from benchmarks.synthetic import make_gyms
+from pipeline.deduplicate import _dedupe_blocks
+
+
+def _timed(gyms: list[dict], use_index: bool, workers: int = 1) -> tuple[list[dict], int, float]:
+    start = time.perf_counter()
+    merged, dupes = _dedupe_blocks(copy.deepcopy(gyms), use_index=use_index, workers=workers)
+    return merged, dupes, time.perf_counter() - start
+
+
+def _dumps(gyms: list[dict]) -> list[str]:
+    return [json.dumps(g, sort_keys=True) for g in gyms]
+
+
+def _scaling(gyms: list[dict], counts: list[int]) -> None:
+    """Time the indexed path with each worker count."""
+    print(f"  cpus: {os.cpu_count()}")
+    first, base_t = None, None
+    for workers in counts:
+        merged, dupes, t = _timed(gyms, use_index=True, workers=workers)
+        if first is None:
+            first, base_t = _dumps(merged), t
+        print(
+            f"  workers={workers:<3} {t:8.2f}s  ({dupes} duplicates merged)"
+            f"  {base_t / max(t, 1e-9):.1f}x  identical: {_dumps(merged) == first}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", help="comma-separated worker counts to time, e.g. 1,2,4")
+    args = parser.parse_args()
+
+    gyms = make_gyms(args.records, seed=args.seed)
+    print(f"Synthetic set: {len(gyms)} records")
+
+    if args.workers:
+        _scaling(gyms, [int(w) for w in args.workers.split(",")])
+        return
+
+    slow, slow_dupes, slow_t = _timed(gyms, use_index=False)
+    print(f"  all-pairs:  {slow_t:8.2f}s  ({slow_dupes} duplicates merged)")
+
+    fast, fast_dupes, fast_t = _timed(gyms, use_index=True)
+    print(f"  indexed:    {fast_t:8.2f}s  ({fast_dupes} duplicates merged)")
+
+    same = _dumps(slow) == _dumps(fast)
+    print(f"  identical output: {same}")
+    print(f"  speedup: {slow_t / max(fast_t, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
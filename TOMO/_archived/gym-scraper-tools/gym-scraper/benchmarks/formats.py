@@ -0,0 +1,75 @@
+"""
+Benchmark: indented JSON vs compact msgpack for processed outputs.
+
+    python -m benchmarks.formats [--records 50000] [--seed 42]
+
+Writes the same synthetic records both ways, checks they read back
+identical, and prints file sizes and load times.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_gyms
+from pipeline.stream import CompactWriter, iter_compact
+
+
+def _best_of(load, repeat: int = 3):
+    """(result, best time) over a few loads, each starting from a clean heap."""
+    best = float("inf")
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = load()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    gyms = make_gyms(args.records, seed=args.seed)
+    for gym in gyms:
+        gym["sources"] = [gym["source"]]
+        gym["source_ids"] = {gym["source"]: gym["slug"]}
+        gym["last_verified"] = "2026-01-01T00:00:00+00:00"
+    print(f"Synthetic set: {len(gyms)} records")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = Path(tmp) / "gyms.json"
+        compact_file = Path(tmp) / "gyms.msgpack"
+
+        with open(json_file, "w") as f:
+            json.dump(gyms, f, indent=2)
+        with CompactWriter(compact_file) as out:
+            for gym in gyms:
+                out.write(gym)
+
+        def load_json():
+            with open(json_file) as f:
+                return json.load(f)
+
+        from_json, json_t = _best_of(load_json)
+        from_compact, compact_t = _best_of(lambda: list(iter_compact(compact_file)))
+
+        json_mb = json_file.stat().st_size / 1e6
+        compact_mb = compact_file.stat().st_size / 1e6
+
+    print(f"  json (indent=2): {json_mb:7.1f} MB  load {json_t:6.2f}s")
+    print(f"  msgpack:         {compact_mb:7.1f} MB  load {compact_t:6.2f}s")
+    print(f"  identical records: {from_json == from_compact}")
+    print(f"  {json_mb / compact_mb:.1f}x smaller, {json_t / max(compact_t, 1e-9):.1f}x faster to load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Synthetic gym records for benchmarks.
+
+Cities follow a Zipf-like size distribution so a handful of metro blocks
+hold hundreds of gyms, like Houston/LA/NYC in real data. About a third of
+records are cross-source variants of another gym (suffixes, dropped
+fields, abbreviated streets, coordinates jittered by a few hundred feet,
+listed under a suburb or with no city).
+
+`make_raw_gyms` dirties the same records the way scrapers deliver them
+(formatted phones, HTML entities, stray whitespace, strings for numbers).
+"""
+
+from __future__ import annotations
+
+import random
+
+WORDS = [
+    "Alpha", "Apex", "Atlas", "Blue", "Core", "Crown", "Elite", "Empire", "Fight",
+    "Forge", "Fusion", "Gold", "Guard", "Iron", "Legacy", "Lion", "Lotus", "Mat",
+    "North", "Omega", "Origin", "Phoenix", "Pride", "Rise", "River", "Shark",
+    "Spartan", "Summit", "Titan", "Tribe", "Unity", "Valor", "Victory", "Warrior",
+    "Wolf", "Zen", "Gracie", "Barra", "Atos", "Checkmat", "Alliance", "Ribeiro",
+]
+SUFFIXES = ["", " BJJ", " Jiu Jitsu", " Academy", " Brazilian Jiu-Jitsu", " MMA"]
+STREETS = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill"]
+STATES = ["TX", "CA", "NY", "FL", "IL", "PA", "OH", "GA", "NC", "MI"]
+SOURCES = ["bjjmetrics", "jiujitsu_com", "alliance", "gracie_barra", "10thplanet"]
+
+
+def _base_gym(rnd: random.Random, i: int, state: str, city: str, center: tuple) -> dict:
+    gym = {
+        "slug": f"gym_{i}",
+        "source": rnd.choice(SOURCES),
+        "name": " ".join(rnd.sample(WORDS, rnd.choice((1, 2, 2, 3)))) + rnd.choice(SUFFIXES),
+        "address": f"{rnd.randint(1, 9999)} {rnd.choice(STREETS)} Street",
+        "city": city,
+        "state": state,
+        "zip": f"{rnd.randint(10000, 99999)}",
+    }
+    if rnd.random() < 0.7:
+        gym["phone"] = f"{rnd.randint(200, 999)}{rnd.randint(1000000, 9999999)}"
+    if rnd.random() < 0.8:
+        gym["lat"] = center[0] + rnd.uniform(-0.3, 0.3)
+        gym["lng"] = center[1] + rnd.uniform(-0.3, 0.3)
+    if rnd.random() < 0.3:
+        gym["website"] = f"https://{gym['slug']}.example.com"
+    return gym
+
+
+def _variant(rnd: random.Random, gym: dict, i: int) -> dict:
+    dup = {**gym, "slug": f"gym_{i}", "source": rnd.choice(SOURCES)}
+    base = gym["name"]
+    for suffix in SUFFIXES[1:]:
+        base = base.removesuffix(suffix)
+    dup["name"] = base + rnd.choice(SUFFIXES)
+    if rnd.random() < 0.3:
+        dup["name"] = dup["name"].upper()
+    if rnd.random() < 0.4:
+        dup["address"] = gym["address"].replace("Street", "St")
+    if rnd.random() < 0.4:
+        dup.pop("phone", None)
+    if dup.get("lat") and rnd.random() < 0.6:
+        dup["lat"] += rnd.uniform(-0.001, 0.001)
+        dup["lng"] += rnd.uniform(-0.001, 0.001)
+    elif rnd.random() < 0.3:
+        dup.pop("lat", None)
+        dup.pop("lng", None)
+    roll = rnd.random()
+    if roll < 0.05 and gym.get("city"):
+        dup["city"] = f"{gym['city']} Heights"
+    elif roll < 0.08:
+        dup.pop("city", None)
+    return dup
+
+
+def make_gyms(n: int = 50_000, cities: int = 400, seed: int = 42) -> list[dict]:
+    """Generate `n` normalized-looking gym records with realistic duplicates."""
+    rnd = random.Random(seed)
+    places = []
+    for c in range(cities):
+        state = STATES[c % len(STATES)]
+        center = (rnd.uniform(26, 47), rnd.uniform(-122, -72))
+        places.append((state, f"City {c}", center))
+    weights = [1 / (rank + 1) for rank in range(cities)]
+
+    gyms: list[dict] = []
+    for i in range(n):
+        if gyms and rnd.random() < 0.35:
+            gyms.append(_variant(rnd, rnd.choice(gyms), i))
+        else:
+            state, city, center = rnd.choices(places, weights)[0]
+            gyms.append(_base_gym(rnd, i, state, city, center))
+    rnd.shuffle(gyms)
+    return gyms
+
+
+STYLE_LISTS = ["BJJ, No-Gi", "Jiu Jitsu", "BJJ, MMA, Muay Thai", "Boxing, Kickboxing", ""]
+
+
+def make_raw_gyms(n: int = 50_000, seed: int = 42) -> list[dict]:
+    """Generate `n` raw, scraper-shaped records for normalization benchmarks."""
+    rnd = random.Random(seed)
+    gyms = make_gyms(n, cities=max(1, n // 125), seed=seed)
+    for gym in gyms:
+        name = gym["name"]
+        if rnd.random() < 0.2:
+            name = name.replace(" ", "  ", 1) + " &amp; Fitness "
+        gym["name"] = name
+        gym["state"] = gym["state"].lower() if rnd.random() < 0.3 else gym["state"]
+        phone = gym.get("phone")
+        if phone and rnd.random() < 0.7:
+            gym["phone"] = f"+1 ({phone[:3]}) {phone[3:6]}-{phone[6:]}"
+        for coord in ("lat", "lng"):
+            if coord in gym and rnd.random() < 0.5:
+                gym[coord] = f"{gym[coord]:.6f}"
+        if rnd.random() < 0.5:
+            gym["rating"] = f"{rnd.uniform(3, 5):.2f}"
+            gym["review_count"] = str(rnd.randint(0, 500))
+        if gym.get("website") and rnd.random() < 0.5:
+            gym["website"] = " " + gym["website"].removeprefix("https://")
+        gym["styles"] = rnd.choice(STYLE_LISTS)
+    return gyms
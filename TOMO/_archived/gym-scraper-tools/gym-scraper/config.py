@@ -12,9 +12,15 @@ DATA_DIR = BASE_DIR / "data"
 RAW_DIR = DATA_DIR / "raw"
 MERGED_DIR = DATA_DIR / "merged"
 READY_DIR = DATA_DIR / "ready"
+CACHE_DIR = DATA_DIR / "http_cache"
+MANIFEST_DIR = DATA_DIR / "manifests"
+DELTA_DIR = DATA_DIR / "delta"
+CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+CENTROID_DIR = DATA_DIR / "centroids"
+STAGE_CACHE_DIR = DATA_DIR / "stage_cache"
 
 # Ensure data dirs exist
-for d in [RAW_DIR, MERGED_DIR, READY_DIR]:
+for d in [RAW_DIR, MERGED_DIR, READY_DIR, CACHE_DIR, MANIFEST_DIR, DELTA_DIR, CHECKPOINT_DIR, CENTROID_DIR, STAGE_CACHE_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
 # Supabase
@@ -26,8 +32,52 @@ GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY", "")
 
 # Scraping
 REQUEST_DELAY = 1.0  # seconds between requests (be polite)
+MAX_CONCURRENCY_PER_HOST = 4  # parallel in-flight requests to any one host
+MAX_REQUESTS_PER_SECOND = 1 / REQUEST_DELAY  # per-host budget, shared by the concurrent requests
+MIN_REQUESTS_PER_SECOND = 0.2  # floor when a host pushes back with 429/5xx
+MAX_RETRIES = 4  # retries on 429/5xx/connection errors
+BACKOFF_BASE = 1.0  # seconds, doubled each retry (with jitter)
+BACKOFF_MAX = 60.0  # cap on any single backoff / Retry-After wait
+
+# HTTP response cache (conditional revalidation between runs)
+CACHE_MAX_AGE_DAYS = 30  # evict entries not revalidated for this long
+CACHE_MAX_BYTES = 500 * 1024 * 1024  # evict oldest entries past this size
+
+# Incremental scraping: re-fetch unchanged detail pages after this many days
+MANIFEST_REFRESH_DAYS = 28
+
+# Scrape checkpoints: resume an interrupted run only within this window
+CHECKPOINT_MAX_AGE_DAYS = 2
+
+# Geocode cache (SQLite, keyed by normalized address)
+GEOCODE_CACHE_PATH = DATA_DIR / "geocode_cache.sqlite"
+GEOCODE_CACHE_TTL_DAYS = 365  # reuse found coordinates for this long
+GEOCODE_NEGATIVE_TTL_DAYS = 30  # retry addresses the geocoder couldn't match after this long
+
+# Single-address geocoding (rate is governed by the per-host limiter above)
+GEOCODE_CONCURRENCY = 4  # in-flight one-line lookups
+GEOCODE_TIMEOUT = 15  # seconds per request
+GEOCODE_SLOW_SECONDS = 5.0  # a response slower than this slows the rate like a 429
+
+# Process stage cache: outputs kept per stage (one per recent input/code version)
+STAGE_CACHE_KEEP = 3
+
+# Diff-based upload: slug → row hash as of the last successful upload
+UPLOAD_SNAPSHOT_PATH = DATA_DIR / "upload_snapshot.json"
+UPLOAD_MAX_DELETE_FRACTION = 0.2  # refuse to prune more of the table than this in one run
+
 USER_AGENT = "TOMO-GymScraper/1.0 (BJJ training app; gym directory builder)"
 
+# Fields that map directly to the Supabase gyms table (also the fixed
+# schema of the compact .msgpack intermediates)
+TABLE_FIELDS = {
+    "name", "slug", "address", "city", "state", "zip",
+    "lat", "lng", "affiliation", "is_headquarters", "website",
+    "phone", "instagram", "rating", "review_count", "styles",
+    "head_instructor", "google_place_id", "sources", "source_ids",
+    "verified", "last_verified", "geo_precision",
+}
+
 # US state codes
 US_STATES = [
     "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA",
@@ -0,0 +1,125 @@
+"""
+Candidate-pair generation for deduplication.
+
+Instead of scoring every pair in a block with `_duplicate_mask`, records
+are first joined on the signals that can make a pair match:
+- exact phone and Google Place ID (hash joins)
+- names whose `token_set_ratio` could reach the name threshold
+
+Every other rule in `_duplicate_mask` (coordinates, address, near-exact name)
+only applies once the names clear the threshold, so these joins propose
+every pair that could match and the dedupe output is unchanged.
+
+`token_set_ratio(a, b)` is the best of three Indel ratios over the shared
+tokens S and each side's remaining tokens:
+1. S+rest(a) vs S+rest(b) — both are token permutations of the deduped,
+   sorted names, so their ratio is at most the ratio of the names' sorted
+   characters (a character-bag bound). That bound is one fast `ratio`
+   cdist per block.
+2. S vs S+rest(a) — high only when the tokens a shares with b make up most
+   of a. Indexing a by its rarest tokens until the rest is too short to
+   reach the threshold guarantees one of them is shared (prefix filtering),
+   without dropping common tokens like "wolf" that subset names depend on.
+3. S vs S+rest(b) — the same from b's side.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+
+import numpy as np
+from rapidfuzz import fuzz as rfuzz, process
+
+# Rows of the block scored per cdist call (bounds the score matrix memory)
+CDIST_CHUNK_ROWS = 1024
+
+# Threads per RapidFuzz batch call (-1 = all cores). Parallel dedupe
+# workers set this to 1 so N processes don't each start N threads.
+SCORER_THREADS = -1
+
+
+def _prefix_tokens(tokens: list[str], freq: Counter, cutoff: float) -> list[str]:
+    """Rarest tokens of a name, enough that case 2 needs one of them shared.
+
+    With shared part S and unshared part U (tokens plus one separator),
+    2|S| / (2|S| + |U|) >= cutoff only if |U| <= share * len(name).
+    """
+    share = (1 - cutoff) * 2 / cutoff
+    share = share / (1 + share)
+    length = len(" ".join(tokens))
+    prefix, unshared = [], 0
+    for token in sorted(tokens, key=lambda t: (freq[t], t)):
+        prefix.append(token)
+        unshared += len(token) + 1
+        if unshared > share * length:
+            break
+    return prefix
+
+
+class CandidateIndex:
+    """Candidate pairs for one block of gym records."""
+
+    def __init__(self, features: list, name_threshold: float):
+        """
+        Args:
+            features: `GymFeatures` of the records in the block, addressed
+                by position (names already processed for scoring).
+            name_threshold: Minimum (rounded) name score that can match.
+        """
+        n = len(features)
+        left: list[np.ndarray] = []
+        right: list[np.ndarray] = []
+
+        postings: dict[tuple, list[int]] = defaultdict(list)
+        for i, f in enumerate(features):
+            if f.phone:
+                postings[("phone", f.phone)].append(i)
+            if f.place_id:
+                postings[("place", f.place_id)].append(i)
+        for ids in postings.values():
+            if len(ids) > 1:
+                ids = np.array(ids)
+                left.append(np.repeat(ids, len(ids)))
+                right.append(np.tile(ids, len(ids)))
+
+        # thefuzz rounds scores to int, so anything >= threshold - 0.5 may pass
+        cutoff = (name_threshold - 0.5) / 100
+        token_sets = [sorted(set(f.name.split())) for f in features]
+
+        # Case 1: character-bag bound, upper triangle only
+        sorted_chars = ["".join(sorted(" ".join(t))) for t in token_sets]
+        for start in range(0, n, CDIST_CHUNK_ROWS):
+            scores = process.cdist(
+                sorted_chars[start : start + CDIST_CHUNK_ROWS],
+                sorted_chars[start:],
+                scorer=rfuzz.ratio,
+                score_cutoff=cutoff * 100,
+                dtype=np.uint8,
+                workers=SCORER_THREADS,
+            )
+            rows, cols = np.nonzero(scores)
+            left.append(rows + start)
+            right.append(cols + start)
+
+        # Cases 2 and 3: prefix tokens against every record holding them
+        by_token: dict[str, list[int]] = defaultdict(list)
+        for i, tokens in enumerate(token_sets):
+            for token in tokens:
+                by_token[token].append(i)
+        freq = Counter({token: len(ids) for token, ids in by_token.items()})
+        arrays = {token: np.array(ids) for token, ids in by_token.items()}
+        for i, tokens in enumerate(token_sets):
+            for token in _prefix_tokens(tokens, freq, cutoff):
+                left.append(np.full(len(arrays[token]), i))
+                right.append(arrays[token])
+
+        # Unique unordered pairs (i < j)
+        a = np.concatenate(left) if left else np.empty(0, dtype=np.int64)
+        b = np.concatenate(right) if right else np.empty(0, dtype=np.int64)
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        keys = np.unique(lo[lo != hi].astype(np.int64) * n + hi[lo != hi])
+        self.left, self.right = keys // n, keys % n
+
+    def pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """Positions (i, j), i < j, of every pair that could be a duplicate."""
+        return self.left, self.right
@@ -0,0 +1,166 @@
+"""
+Offline ZIP / city centroid lookup.
+
+Approximate coordinates for gyms the geocoder can't place (no street
+address, or no match), from the Census Gazetteer ZCTA and place files.
+The tables are stored as sorted NumPy arrays and memory-mapped, so a
+lookup is a binary search with no network and no parsing:
+
+    data/centroids/zip.npy    (zip: uint32, lat: float32, lng: float32)
+    data/centroids/city.npy   (key: uint64 hash of "STATE:city", lat, lng)
+
+Build (or refresh) them once with:
+
+    python -m pipeline.centroids [--zcta FILE] [--places FILE]
+
+Without file arguments the Gazetteer zips are downloaded from census.gov.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import re
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from config import CENTROID_DIR, USER_AGENT
+
+GAZETTEER_BASE = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer"
+ZCTA_URL = f"{GAZETTEER_BASE}/2023_Gaz_zcta_national.zip"
+PLACES_URL = f"{GAZETTEER_BASE}/2023_Gaz_place_national.zip"
+
+ZIP_DTYPE = np.dtype([("zip", "<u4"), ("lat", "<f4"), ("lng", "<f4")])
+CITY_DTYPE = np.dtype([("key", "<u8"), ("lat", "<f4"), ("lng", "<f4")])
+
+# Legal/statistical area types (LSAD) that end Gazetteer place names:
+# "Houston city", "Nashville-Davidson metropolitan government (balance)".
+# Listed explicitly so names that really end in a lowercase word keep it.
+PLACE_TYPES = (
+    "city and borough", "city", "town", "township", "village", "borough",
+    "municipality", "CDP", "comunidad", "zona urbana", "corporation",
+    "plantation", "consolidated government", "metropolitan government",
+    "metro government", "unified government", "urban county",
+)
+_PLACE_SUFFIX = re.compile(
+    r"\s+(?:" + "|".join(map(re.escape, PLACE_TYPES)) + r")(?:\s+\(balance\))?$"
+)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_ABBREVIATIONS = {"saint": "st", "sainte": "ste", "mount": "mt", "fort": "ft"}
+
+
+def _city_key(state: str, city: str) -> int:
+    """64-bit key for a (state, city) pair, insensitive to case,
+    punctuation and Saint/St.-style spellings."""
+    words = _PUNCTUATION.sub(" ", city.lower()).split()
+    words = [_ABBREVIATIONS.get(w, w) for w in words]
+    text = f"{state.upper()}:{' '.join(words)}"
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _zip_code(value) -> int | None:
+    digits = str(value or "").strip()[:5]
+    return int(digits) if len(digits) == 5 and digits.isdigit() else None
+
+
+class CentroidIndex:
+    """Memory-mapped ZIP and city centroid tables."""
+
+    def __init__(self, directory: Path = CENTROID_DIR):
+        self.zips = self._load(directory / "zip.npy")
+        self.cities = self._load(directory / "city.npy")
+
+    @staticmethod
+    def _load(path: Path) -> np.ndarray | None:
+        return np.load(path, mmap_mode="r") if path.exists() else None
+
+    @property
+    def available(self) -> bool:
+        return self.zips is not None or self.cities is not None
+
+    @staticmethod
+    def _find(table: np.ndarray | None, field: str, key: int) -> tuple[float, float] | None:
+        if table is None or not len(table):
+            return None
+        keys = table[field]
+        i = int(np.searchsorted(keys, key))
+        if i < len(keys) and keys[i] == key:
+            # float32 storage: round off the noise (5 places ≈ 1 m)
+            return round(float(table["lat"][i]), 5), round(float(table["lng"][i]), 5)
+        return None
+
+    def lookup(self, gym: dict) -> tuple[float, float, str] | None:
+        """Approximate (lat, lng, precision) for a gym, ZIP first, then city.
+
+        precision is "zip" or "city"; None if neither is known.
+        """
+        code = _zip_code(gym.get("zip"))
+        if code is not None:
+            coords = self._find(self.zips, "zip", code)
+            if coords:
+                return (*coords, "zip")
+        if gym.get("city") and gym.get("state"):
+            coords = self._find(self.cities, "key", _city_key(gym["state"], gym["city"]))
+            if coords:
+                return (*coords, "city")
+        return None
+
+
+def _read_gazetteer(source: str | None, url: str) -> list[dict]:
+    """Rows of a Gazetteer file (tab-separated, possibly zipped)."""
+    if source:
+        data = Path(source).read_bytes()
+    else:
+        print(f"  Downloading {url}")
+        resp = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=120)
+        resp.raise_for_status()
+        data = resp.content
+
+    if data[:2] == b"PK":
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            data = zf.read(next(n for n in zf.namelist() if n.endswith(".txt")))
+
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")), delimiter="\t")
+    # The last header has trailing whitespace in every Gazetteer release
+    return [{k.strip(): (v or "").strip() for k, v in row.items()} for row in reader]
+
+
+def build(zcta_file: str | None = None, places_file: str | None = None, directory: Path = CENTROID_DIR) -> None:
+    """Build the centroid tables from Census Gazetteer files."""
+    directory.mkdir(parents=True, exist_ok=True)
+
+    zips = {}
+    for row in _read_gazetteer(zcta_file, ZCTA_URL):
+        code = _zip_code(row.get("GEOID"))
+        if code is not None:
+            zips[code] = (float(row["INTPTLAT"]), float(row["INTPTLONG"]))
+    table = np.array([(k, *v) for k, v in sorted(zips.items())], dtype=ZIP_DTYPE)
+    np.save(directory / "zip.npy", table)
+    print(f"  {len(table)} ZIP centroids → {directory / 'zip.npy'}")
+
+    cities = {}
+    for row in _read_gazetteer(places_file, PLACES_URL):
+        name = _PLACE_SUFFIX.sub("", row["NAME"])
+        key = _city_key(row["USPS"], name)
+        # Keep the first (state, name) — duplicates are rare CDP/city pairs
+        cities.setdefault(key, (float(row["INTPTLAT"]), float(row["INTPTLONG"])))
+    table = np.array([(k, *v) for k, v in sorted(cities.items())], dtype=CITY_DTYPE)
+    np.save(directory / "city.npy", table)
+    print(f"  {len(table)} city centroids → {directory / 'city.npy'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline ZIP/city centroid index.")
+    parser.add_argument("--zcta", help="Gazetteer ZCTA file (.txt or .zip); downloaded if omitted")
+    parser.add_argument("--places", help="Gazetteer place file (.txt or .zip); downloaded if omitted")
+    args = parser.parse_args()
+    build(args.zcta, args.places)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
 """
 Deduplicate gym records across sources.
 
-Uses blocking on (state, city) and fuzzy name matching to find duplicates,
-then merges records keeping the richest data.
+Uses blocking on (state, city) and fuzzy name matching to find duplicate
+pairs, clusters them around the richest record each matches, then merges
+each cluster into that record. Large blocks only compare pairs proposed by
+a candidate index (see candidates.py). A second, spatial pass compares
+records with coordinates across blocks ("St. Louis" vs "Saint Louis", suburb vs metro
+city, records with no city).
 """
 
-import math
+import json
+import tempfile
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from itertools import repeat
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
 
-from thefuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz as rfuzz, process
+from thefuzz import utils
+
+from pipeline import candidates
+from pipeline.candidates import CandidateIndex
+from pipeline.geo import haversine_miles, pairs_within
 
 
 # Thresholds
@@ -16,16 +32,16 @@ NAME_SIMILARITY_THRESHOLD = 85      # token_set_ratio score
 ADDRESS_SIMILARITY_THRESHOLD = 80
 COORD_PROXIMITY_MILES = 0.15         # ~800 feet
 
+NAME_ONLY_THRESHOLD = 95            # name match alone, no location signal
+
+# Blocks smaller than this are compared all-pairs (index overhead isn't worth it)
+INDEX_MIN_BLOCK_SIZE = 32
 
-def _haversine_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Distance in miles between two lat/lng points."""
-    R = 3959  # Earth radius in miles
-    dlat = math.radians(lat2 - lat1)
-    dlng = math.radians(lng2 - lng1)
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlng / 2) ** 2)
-    return R * 2 * math.asin(math.sqrt(a))
+# Pairs scored per batched call (bounds memory on huge candidate sets)
+SCORE_BATCH_SIZE = 100_000
+
+# Small blocks handed to each dedupe worker at once (amortizes IPC)
+WORKER_CHUNK_SIZE = 16
 
 
 def _normalize_for_compare(name: str) -> str:
@@ -37,74 +53,149 @@ def _normalize_for_compare(name: str) -> str:
     return n
 
 
-def _is_duplicate(a: dict, b: dict) -> bool:
-    """Check if two gym records are likely the same gym."""
-    # Phone match is a strong signal
-    if a.get("phone") and b.get("phone") and a["phone"] == b["phone"]:
-        return True
+class GymFeatures(NamedTuple):
+    """What `_duplicate_mask` compares, computed once per record.
 
-    # Google Place ID match is definitive
-    if a.get("google_place_id") and b.get("google_place_id"):
-        if a["google_place_id"] == b["google_place_id"]:
-            return True
+    Strings are already processed the way thefuzz processes them before
+    scoring, so the batched scorer sees exactly what `fuzz.token_set_ratio`
+    would.
+    """
+    name: str
+    address: str | None
+    phone: str | None
+    place_id: str | None
+    lat: float | None
+    lng: float | None
+
+
+def _fuzz_processor(text: str) -> str:
+    """Same preprocessing `thefuzz.fuzz.token_set_ratio` applies by default."""
+    return utils.full_process(text, force_ascii=True)
+
+
+def _features(gym: dict) -> GymFeatures:
+    has_coords = bool(gym.get("lat") and gym.get("lng"))
+    return GymFeatures(
+        name=_fuzz_processor(_normalize_for_compare(gym.get("name") or "")),
+        address=_fuzz_processor(gym["address"].lower()) if gym.get("address") else None,
+        phone=gym.get("phone") or None,
+        place_id=gym.get("google_place_id") or None,
+        lat=gym["lat"] if has_coords else None,
+        lng=gym["lng"] if has_coords else None,
+    )
+
+
+class FeatureTable:
+    """`GymFeatures` of many records stored column-wise for batched scoring."""
+
+    def __init__(self, features: list[GymFeatures]):
+        self.names = np.array([f.name for f in features], dtype=object)
+        self.addresses = np.array([f.address or "" for f in features], dtype=object)
+        self.has_address = np.array([f.address is not None for f in features], dtype=bool)
+        self.phones = _codes([f.phone for f in features])
+        self.places = _codes([f.place_id for f in features])
+        self.lat = np.array([np.nan if f.lat is None else f.lat for f in features], dtype=np.float64)
+        self.lng = np.array([np.nan if f.lng is None else f.lng for f in features], dtype=np.float64)
+
+
+def _codes(values: list) -> np.ndarray:
+    """Integer code per value (equal values share a code), -1 where missing."""
+    codes: dict = {}
+    return np.array([codes.setdefault(v, len(codes)) if v else -1 for v in values], dtype=np.int64)
+
+
+def _token_set_scores(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Element-wise `fuzz.token_set_ratio`, rounded like thefuzz, in one call."""
+    scores = process.cpdist(
+        left, right, scorer=rfuzz.token_set_ratio, dtype=np.float64,
+        workers=candidates.SCORER_THREADS,
+    )
+    return np.round(scores)
+
+
+def _duplicate_mask(
+    table: FeatureTable, left: np.ndarray, right: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """For each pair (left[k], right[k]), whether they are likely the same gym.
+
+    Applies the same rules as a pairwise check: phone or Place ID match;
+    otherwise similar names plus nearby coordinates, a similar address, or
+    a near-exact name. Names and addresses are scored in one batched call
+    each instead of one Python call per pair.
+
+    Returns the duplicate mask and, within it, the pairs matched on the
+    name alone (weaker: "Gracie Barra" matches every "Gracie Barra ...").
+    """
+    # Phone match is a strong signal; Google Place ID match is definitive
+    is_dupe = (
+        ((table.phones[left] >= 0) & (table.phones[left] == table.phones[right]))
+        | ((table.places[left] >= 0) & (table.places[left] == table.places[right]))
+    )
 
     # Name similarity
-    name_a = _normalize_for_compare(a.get("name", ""))
-    name_b = _normalize_for_compare(b.get("name", ""))
-    name_score = fuzz.token_set_ratio(name_a, name_b)
-
-    if name_score < NAME_SIMILARITY_THRESHOLD:
-        return False
+    fuzzy = np.flatnonzero(~is_dupe)
+    name_scores = _token_set_scores(table.names[left[fuzzy]], table.names[right[fuzzy]])
+    passed = name_scores >= NAME_SIMILARITY_THRESHOLD
+    similar, name_scores = fuzzy[passed], name_scores[passed]
+    a, b = left[similar], right[similar]
 
-    # If names are similar, check coords or address
-    if (a.get("lat") and a.get("lng") and b.get("lat") and b.get("lng")):
-        dist = _haversine_miles(a["lat"], a["lng"], b["lat"], b["lng"])
-        if dist < COORD_PROXIMITY_MILES:
-            return True
+    # If names are similar, check coords or address (NaN coords are never near)
+    dist = haversine_miles(table.lat[a], table.lng[a], table.lat[b], table.lng[b])
+    near = dist < COORD_PROXIMITY_MILES
 
     # Address similarity as fallback
-    if a.get("address") and b.get("address"):
-        addr_score = fuzz.token_set_ratio(
-            a["address"].lower(), b["address"].lower()
-        )
-        if addr_score >= ADDRESS_SIMILARITY_THRESHOLD:
-            return True
+    address_ok = np.zeros(len(similar), dtype=bool)
+    check = np.flatnonzero(~near & table.has_address[a] & table.has_address[b])
+    address_scores = _token_set_scores(table.addresses[a[check]], table.addresses[b[check]])
+    address_ok[check] = address_scores >= ADDRESS_SIMILARITY_THRESHOLD
 
     # Very high name match alone (exact or near-exact)
-    if name_score >= 95:
-        return True
-
-    return False
-
-
-def _merge_records(primary: dict, secondary: dict) -> dict:
-    """Merge two gym records, preferring primary but filling gaps from secondary."""
-    merged = {**primary}
-
-    # Fill in missing fields from secondary
-    for key in secondary:
-        if key == "sources":
-            continue  # handled separately
-        if not merged.get(key) and secondary.get(key):
-            merged[key] = secondary[key]
-
-    # Merge sources
-    sources = set(merged.get("sources", []) or [])
-    sources.update(secondary.get("sources", []) or [])
-    if merged.get("source"):
-        sources.add(merged["source"])
-    if secondary.get("source"):
-        sources.add(secondary["source"])
-    merged["sources"] = sorted(sources)
+    located = near | address_ok
+    name_only = np.zeros(len(left), dtype=bool)
+    name_only[similar] = ~located & (name_scores >= NAME_ONLY_THRESHOLD)
+    is_dupe[similar] = located
+    return is_dupe | name_only, name_only
 
-    # Merge source_ids
-    ids = {**(merged.get("source_ids") or {}), **(secondary.get("source_ids") or {})}
+
+def _merge_cluster(gyms: list[dict]) -> dict:
+    """Merge a cluster of duplicates into its first record.
+
+    Later records only fill fields the merged record is still missing;
+    sources and source_ids are unioned across the whole cluster, and
+    `member_slugs` lists every record merged in (see `deduplicate_delta`).
+    """
+    merged = {**gyms[0]}
+    sources = set()
+    ids = {}
+    slugs = {}
+    for gym in gyms:
+        # Fill in missing fields
+        for key in gym:
+            if key in ("sources", "member_slugs"):
+                continue  # handled separately
+            if not merged.get(key) and gym.get(key):
+                merged[key] = gym[key]
+
+        sources.update(gym.get("sources", []) or [])
+        if gym.get("source"):
+            sources.add(gym["source"])
+        ids.update(gym.get("source_ids") or {})
+        slugs.update(dict.fromkeys(_member_slugs(gym)))
+
+    merged["sources"] = sorted(sources)
     if ids:
         merged["source_ids"] = ids
-
+    merged["member_slugs"] = list(slugs)
     return merged
 
 
+def _member_slugs(gym: dict) -> list[str]:
+    """Slugs of the records a merged record was built from."""
+    if gym.get("member_slugs"):
+        return gym["member_slugs"]
+    return [gym["slug"]] if gym.get("slug") else []
+
+
 def _richness_score(gym: dict) -> int:
     """Score how complete a record is (higher = more data)."""
     score = 0
@@ -118,47 +209,348 @@ def _richness_score(gym: dict) -> int:
     return score
 
 
-def deduplicate(gyms: list[dict]) -> list[dict]:
-    """Deduplicate a list of gym records.
+def _block_key(gym: dict) -> str | None:
+    """(state, city) blocking key, or None if either is missing."""
+    state = (gym.get("state") or "").upper()
+    city = (gym.get("city") or "").lower().strip()
+    return f"{state}:{city}" if state and city else None
 
-    Uses blocking on (state, city) to limit comparisons, then fuzzy
-    matching within each block.
+
+class Edges(NamedTuple):
+    """Duplicate pairs (left[k], right[k]) and which matched on name alone."""
+    left: np.ndarray
+    right: np.ndarray
+    name_only: np.ndarray
+
+
+def _duplicate_edges(table: FeatureTable, left: np.ndarray, right: np.ndarray) -> Edges:
+    """Score pairs in batches; returns the pairs that are duplicates."""
+    found_a, found_b, found_weak = [left[:0]], [right[:0]], [np.zeros(0, dtype=bool)]
+    for start in range(0, len(left), SCORE_BATCH_SIZE):
+        a = left[start : start + SCORE_BATCH_SIZE]
+        b = right[start : start + SCORE_BATCH_SIZE]
+        mask, name_only = _duplicate_mask(table, a, b)
+        found_a.append(a[mask])
+        found_b.append(b[mask])
+        found_weak.append(name_only[mask])
+    return Edges(np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_weak))
+
+
+def _block_edges(features: list[GymFeatures], use_index: bool) -> Edges:
+    """Duplicate pairs within one (state, city) block, as block positions.
+
+    Large blocks only score pairs proposed by the candidate index. Runs in
+    a worker process when deduping in parallel.
     """
-    # Block by (state, city_lower)
-    blocks: dict[str, list[dict]] = defaultdict(list)
-    no_location = []
+    if use_index and len(features) >= INDEX_MIN_BLOCK_SIZE:
+        a, b = CandidateIndex(features, NAME_SIMILARITY_THRESHOLD).pairs()
+    else:
+        a, b = np.triu_indices(len(features), k=1)
+    return _duplicate_edges(FeatureTable(features), a, b)
 
-    for gym in gyms:
-        state = (gym.get("state") or "").upper()
-        city = (gym.get("city") or "").lower().strip()
-        if state and city:
-            blocks[f"{state}:{city}"].append(gym)
-        else:
-            no_location.append(gym)
+
+def _init_worker() -> None:
+    # Each worker scores on one thread; the processes are the parallelism
+    candidates.SCORER_THREADS = 1
+
+
+def _worker_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for scoring blocks, reusable across `_dedupe_blocks` calls."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def _spatial_pairs(table: FeatureTable, keys: list[str | None]) -> tuple[np.ndarray, np.ndarray]:
+    """Pairs the (state, city) blocks kept apart that lie within proximity.
+
+    Only records in the same or adjacent grid cells (sized to
+    COORD_PROXIMITY_MILES) are measured, see `pairs_within`. Pairs from the
+    same block were already compared and are skipped.
+    """
+    a, b = pairs_within(table.lat, table.lng, COORD_PROXIMITY_MILES)
+    block = _codes(keys)
+    apart = (block[a] < 0) | (block[a] != block[b])
+    return a[apart], b[apart]
+
+
+def _cluster_order(gym: dict) -> tuple:
+    """Richest record first; ties broken by content, not input order."""
+    return (-_richness_score(gym), gym.get("source") or "", gym.get("slug") or "")
+
+
+def _clusters(gyms: list[dict], edges: list[Edges]) -> list[list[int]]:
+    """Group duplicate pairs into clusters around a primary record.
+
+    Matching is not transitive ("Gracie Barra" matches both "Gracie Barra
+    Houston" and "Gracie Barra Katy"), so a record only ever joins a
+    cluster by matching its primary directly, never through another member.
+    Records are visited richest first (`_cluster_order`); each one not yet
+    taken becomes a primary and takes every untaken record it matches on
+    more than the name. Then each primary, in the same order, takes the
+    later records left on their own that match it on the name alone, so
+    a generic name can't pull in records that have a closer match.
+
+    Returns member positions per cluster, primary first, in order of
+    each cluster's lowest position.
+    """
+    strong: dict[int, list[int]] = defaultdict(list)
+    weak: dict[int, list[int]] = defaultdict(list)
+    for e in edges:
+        for i, j, name_only in zip(e.left.tolist(), e.right.tolist(), e.name_only.tolist()):
+            matches = weak if name_only else strong
+            matches[i].append(j)
+            matches[j].append(i)
+
+    order = sorted(range(len(gyms)), key=lambda i: (_cluster_order(gyms[i]), i))
+    rank = [0] * len(gyms)
+    for r, i in enumerate(order):
+        rank[i] = r
+
+    cluster_of: dict[int, list[int]] = {}
+    primaries = []
+    for i in order:
+        if i in cluster_of:
+            continue
+        members = [i, *dict.fromkeys(j for j in strong.get(i, ()) if j not in cluster_of)]
+        for j in members:
+            cluster_of[j] = members
+        primaries.append(i)
+
+    clusters = []
+    for i in primaries:
+        members = cluster_of[i]
+        if members[0] != i:
+            continue  # a lone record taken on its name by an earlier primary
+        for j in weak.get(i, ()):
+            alone = cluster_of[j]
+            # Earlier records have had their turn (and may be a cluster already)
+            if rank[j] > rank[i] and len(alone) == 1 and alone[0] == j:
+                members.append(j)
+                cluster_of[j] = members
+        clusters.append(members)
+
+    for members in clusters:
+        members[1:] = sorted(members[1:], key=rank.__getitem__)
+    clusters.sort(key=min)
+    return clusters
+
+
+def _dedupe_blocks(
+    gyms: list[dict],
+    use_index: bool = True,
+    workers: int = 1,
+    pool: ProcessPoolExecutor | None = None,
+    groups: np.ndarray | None = None,
+) -> tuple[list[dict], int]:
+    """Cluster duplicates and merge each cluster once.
+
+    Each record's comparison features are computed once. Duplicate pairs
+    are scored in batches within (state, city) blocks and then across
+    blocks spatially, grouped around the richest record they match (see
+    `_clusters`), and each cluster is merged into that record. The clusters
+    do not depend on input order.
+
+    Args:
+        gyms: Normalized gym records.
+        use_index: Use the candidate index for large blocks.
+        workers: If > 1, score blocks in this many processes, largest
+            first. The output is identical to a serial run.
+        pool: Score blocks in this pool (see `_worker_pool`) instead of
+            starting one per call.
+        groups: Cluster of each record in an earlier run, or -1 for a
+            record that is free to match anything. Records from
+            different earlier clusters are never linked.
+
+    Returns the merged records and the number of duplicates merged.
+    """
+    # Block by (state, city_lower); gyms without a city only meet others
+    # in the spatial pass
+    keys = [_block_key(gym) for gym in gyms]
+    blocks: dict[str, list[int]] = defaultdict(list)
+    for i, key in enumerate(keys):
+        if key:
+            blocks[key].append(i)
+
+    features = [_features(gym) for gym in gyms]
+
+    # Largest blocks first so no worker is left with a big block at the end
+    jobs = sorted((b for b in blocks.values() if len(b) > 1), key=len, reverse=True)
+    block_features = ([features[i] for i in block] for block in jobs)
+    if jobs and (pool is not None or workers > 1):
+        with nullcontext(pool) if pool is not None else _worker_pool(workers) as pool:
+            edges = list(pool.map(
+                _block_edges, block_features, repeat(use_index), chunksize=WORKER_CHUNK_SIZE,
+            ))
+    else:
+        edges = [_block_edges(f, use_index) for f in block_features]
+    found = []
+    for block, e in zip(jobs, edges):
+        positions = np.array(block, dtype=np.int64)
+        found.append(Edges(positions[e.left], positions[e.right], e.name_only))
+
+    table = FeatureTable(features)
+    found.append(_duplicate_edges(table, *_spatial_pairs(table, keys)))
+    if groups is not None:
+        found = [
+            Edges(*(x[keep] for x in e)) for e in found
+            for keep in [(groups[e.left] < 0) | (groups[e.right] < 0) | (groups[e.left] == groups[e.right])]
+        ]
 
     merged_gyms = []
-    total_dupes = 0
-
-    for block_key, block_gyms in blocks.items():
-        # Sort by richness so the best record is primary
-        block_gyms.sort(key=_richness_score, reverse=True)
-
-        used = set()
-        for i, gym_a in enumerate(block_gyms):
-            if i in used:
-                continue
-            merged = gym_a
-            for j in range(i + 1, len(block_gyms)):
-                if j in used:
-                    continue
-                if _is_duplicate(merged, block_gyms[j]):
-                    merged = _merge_records(merged, block_gyms[j])
-                    used.add(j)
-                    total_dupes += 1
-            merged_gyms.append(merged)
+    for members in _clusters(gyms, found):
+        if len(members) == 1:
+            merged_gyms.append(gyms[members[0]])
+        else:
+            merged_gyms.append(_merge_cluster([gyms[i] for i in members]))
+    return merged_gyms, len(gyms) - len(merged_gyms)
 
-    # Add gyms without location info (can't dedupe them reliably)
-    merged_gyms.extend(no_location)
 
+def deduplicate(gyms: list[dict], workers: int = 1) -> list[dict]:
+    """Deduplicate a list of gym records.
+
+    Uses blocking on (state, city) to limit comparisons, then fuzzy
+    matching within each block, then a spatial pass across blocks.
+    With workers > 1, blocks are scored in a process pool.
+    """
+    merged_gyms, total_dupes = _dedupe_blocks(gyms, workers=workers)
     print(f"  Deduplication: {len(gyms)} → {len(merged_gyms)} ({total_dupes} duplicates merged)")
     return merged_gyms
+
+
+def deduplicate_delta(
+    delta: list[dict],
+    base: list[dict],
+    load_members: Callable[[set[str]], Iterable[dict]],
+    workers: int = 1,
+) -> list[dict]:
+    """Merge new/changed records into the clusters of the last full run.
+
+    Each delta record is mapped to the cluster of `base` it was merged
+    into (by `member_slugs`). Those clusters are rebuilt from their
+    members' current records, and deduped together with the delta and
+    with the untouched merged records of the same states, so a new or
+    changed gym can still join an existing one. Only rows that contain a
+    delta record are returned.
+
+    A row keeps the slug of the existing cluster whose primary it still
+    contains, so upserting it updates that row instead of adding one.
+    When a rebuild joins two existing rows, one of them is left behind;
+    a full process and `upload --prune` removes it.
+
+    Args:
+        delta: Normalized new/changed records.
+        base: Merged output of the last full run.
+        load_members: Returns the normalized current records of the
+            given slugs (the other members of the clusters touched).
+        workers: Score blocks in this many processes.
+    """
+    owner = {slug: i for i, gym in enumerate(base) for slug in _member_slugs(gym)}
+    records = {gym["slug"]: gym for gym in delta}
+    delta_slugs = set(records)
+    touched = {owner[slug] for slug in records if slug in owner}
+    wanted = {slug for i in touched for slug in _member_slugs(base[i])} - records.keys()
+    if wanted:
+        for gym in load_members(wanted):
+            records.setdefault(gym["slug"], gym)
+
+    # Untouched rows that new records may join. Geocoded coordinates are
+    # dropped: the full run deduped before geocoding, and a centroid
+    # would look "near" unrelated gyms.
+    states = {(gym.get("state") or "").upper() for gym in records.values()}
+    neighbours, neighbour_index = [], []
+    for i, gym in enumerate(base):
+        if i not in touched and (gym.get("state") or "").upper() in states:
+            if gym.get("geo_precision"):
+                gym = {k: v for k, v in gym.items() if k not in ("lat", "lng", "geo_precision")}
+            neighbours.append(gym)
+            neighbour_index.append(i)
+    unchanged = {id(gym) for gym in neighbours}
+
+    # Existing clusters stay apart (the full run already compared them);
+    # only the delta records may move
+    groups = np.array(
+        [-1 if slug in delta_slugs else owner[slug] for slug in records]
+        + neighbour_index,
+        dtype=np.int64,
+    )
+    merged_gyms, _ = _dedupe_blocks(list(records.values()) + neighbours, workers=workers, groups=groups)
+
+    rows = []
+    joined = 0
+    for gym in merged_gyms:
+        if id(gym) in unchanged:
+            continue
+        members = set(_member_slugs(gym))
+        kept = [base[i]["slug"] for i in {owner[s] for s in members if s in owner}
+                if base[i]["slug"] in members]
+        if kept:
+            gym["slug"] = min(kept, key=lambda slug: (slug != gym["slug"], slug))
+            joined += len(kept) - 1
+        rows.append(gym)
+
+    print(f"  Deduplication (delta): {len(delta)} new/changed records, "
+          f"{len(touched)} existing clusters rebuilt → {len(rows)} rows")
+    if joined:
+        print(f"  {joined} existing rows were merged into others; "
+              f"run a full process and `upload --prune` to remove them")
+    return rows
+
+
+def deduplicate_stream(gyms: Iterable[dict], workers: int = 1) -> Iterator[dict]:
+    """Deduplicate a stream of gym records with bounded memory.
+
+    Records are spilled to one temporary JSONL partition per state (every
+    dedupe block lies within a single state), then each partition is
+    loaded and deduped on its own. Peak memory is the largest state, not
+    the whole dataset.
+
+    Records without a state can only match through the spatial pass, so
+    those with coordinates are held in memory and deduped with every
+    state partition until one of them merges them; the rest come out at
+    the end. Unlike `deduplicate`, two records with different states are
+    never compared, even when they lie within proximity across a state
+    line.
+    """
+    with tempfile.TemporaryDirectory(prefix="gym-dedupe-") as tmp:
+        partitions: dict[str, object] = {}
+        stateless = []
+        total_in = 0
+        try:
+            for gym in gyms:
+                total_in += 1
+                state = (gym.get("state") or "").upper()
+                if not state:
+                    stateless.append(gym)
+                    continue
+                if state not in partitions:
+                    partitions[state] = open(Path(tmp) / f"{state}.jsonl", "w")
+                partitions[state].write(json.dumps(gym) + "\n")
+        finally:
+            for f in partitions.values():
+                f.close()
+
+        # Without coordinates a stateless record can't match anything
+        pending = [g for g in stateless if g.get("lat") and g.get("lng")]
+        unlocated = [g for g in stateless if not (g.get("lat") and g.get("lng"))]
+
+        total_out = 0
+        with ExitStack() as stack:
+            # One pool for every partition rather than one per state
+            pool = stack.enter_context(_worker_pool(workers)) if workers > 1 else None
+            for state in sorted(partitions):
+                with open(Path(tmp) / f"{state}.jsonl") as f:
+                    block = [json.loads(line) for line in f]
+                merged_gyms, _ = _dedupe_blocks(block + pending, pool=pool)
+                # Pending records that merged nothing come back unchanged
+                unmatched = {id(g) for g in pending}
+                pending = [g for g in merged_gyms if id(g) in unmatched]
+                merged_gyms = [g for g in merged_gyms if id(g) not in unmatched]
+                total_out += len(merged_gyms)
+                yield from merged_gyms
+
+        if len(pending) > 1:
+            pending, _ = _dedupe_blocks(pending)
+        total_out += len(pending) + len(unlocated)
+        yield from pending
+        yield from unlocated
+
+    print(f"  Deduplication: {total_in} → {total_out} ({total_in - total_out} duplicates merged)")
@@ -0,0 +1,86 @@
+"""
+Vectorized distance helpers over NumPy lat/lng arrays.
+
+Used by deduplication's coordinate checks and spatial pass, and meant for
+any other "gyms near X" tooling. Missing coordinates are NaN; every
+comparison against a NaN distance is False, so such records never count
+as nearby.
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3959
+
+# Grid cells must stay wider than the radius up to this latitude
+# (Alaska tops out around 71.4°N)
+GRID_MAX_LAT = 72.0
+MILES_PER_DEGREE_LAT = 69.05
+
+
+def haversine_miles(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Element-wise great-circle distance in miles (arrays broadcast)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return EARTH_RADIUS_MILES * 2 * np.arcsin(np.sqrt(a))
+
+
+def distance_matrix_miles(lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """Pairwise distances (n × n) between n points."""
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    return haversine_miles(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+
+
+class GeoGrid:
+    """Fixed lat/lng grid where any two points closer than `radius_miles`
+    fall in the same or adjacent cells."""
+
+    def __init__(self, radius_miles: float):
+        self.lat_step = radius_miles / MILES_PER_DEGREE_LAT * 1.1
+        self.lng_step = self.lat_step / math.cos(math.radians(GRID_MAX_LAT))
+
+    def cells(self, lat: np.ndarray, lng: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Row and column of each point's cell."""
+        return (
+            np.floor(lat / self.lat_step).astype(np.int64),
+            np.floor(lng / self.lng_step).astype(np.int64),
+        )
+
+
+def pairs_within(lat, lng, radius_miles: float) -> tuple[np.ndarray, np.ndarray]:
+    """Positions (i, j), i < j, of every pair of points closer than the radius.
+
+    Points are bucketed into a `GeoGrid`, so only points in the same or
+    adjacent cells are measured. Points with NaN coordinates are skipped.
+    """
+    lat, lng = np.asarray(lat, dtype=np.float64), np.asarray(lng, dtype=np.float64)
+    located = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lng))
+    rows, cols = GeoGrid(radius_miles).cells(lat[located], lng[located])
+
+    # Sort points by cell so each neighbouring cell is one contiguous range
+    keys = rows * 2**32 + cols
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    left, right = [], []
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            target = keys + dr * 2**32 + dc
+            lo = np.searchsorted(sorted_keys, target, side="left")
+            hi = np.searchsorted(sorted_keys, target, side="right")
+            counts = hi - lo
+            # Expand each point's [lo, hi) range into explicit pairs
+            starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+            left.append(np.repeat(np.arange(len(located)), counts))
+            right.append(order[starts + np.arange(counts.sum())])
+
+    a = located[np.concatenate(left)]
+    b = located[np.concatenate(right)]
+    keep = a < b
+    a, b = a[keep], b[keep]
+    near = haversine_miles(lat[a], lng[a], lat[b], lng[b]) < radius_miles
+    return a[near], b[near]
@@ -0,0 +1,85 @@
+"""
+Persistent geocode cache.
+
+Results from the geocoder are stored in a local SQLite file keyed by the
+normalized address string, so re-processing the same data doesn't repeat
+lookups. Addresses the geocoder could not match are cached too (as
+negative entries) with a shorter TTL, so they are retried occasionally.
+Network errors are never cached.
+"""
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from config import GEOCODE_CACHE_PATH, GEOCODE_CACHE_TTL_DAYS, GEOCODE_NEGATIVE_TTL_DAYS
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_address(address: str) -> str:
+    """Cache key for an address: lowercase, no punctuation, single spaces."""
+    return " ".join(_PUNCTUATION.sub(" ", address.lower()).split())
+
+
+class GeocodeCache:
+    """SQLite-backed address → (lat, lng) cache with positive/negative TTLs."""
+
+    def __init__(
+        self,
+        path: Path = GEOCODE_CACHE_PATH,
+        ttl_days: float = GEOCODE_CACHE_TTL_DAYS,
+        negative_ttl_days: float = GEOCODE_NEGATIVE_TTL_DAYS,
+    ):
+        self.ttl = ttl_days * 86400
+        self.negative_ttl = negative_ttl_days * 86400
+        self.hits = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            " address TEXT PRIMARY KEY,"
+            " lat REAL,"
+            " lng REAL,"
+            " fetched_at REAL NOT NULL)"
+        )
+
+    def get(self, address: str) -> tuple[bool, tuple[float, float] | None]:
+        """Look up an address.
+
+        Returns (found, coords): found is False on a miss or an expired
+        entry; coords is None for a cached "no match".
+        """
+        row = self._db.execute(
+            "SELECT lat, lng, fetched_at FROM geocodes WHERE address = ?",
+            (normalize_address(address),),
+        ).fetchone()
+        if row is None:
+            return False, None
+
+        lat, lng, fetched_at = row
+        ttl = self.negative_ttl if lat is None else self.ttl
+        if time.time() - fetched_at > ttl:
+            return False, None
+        self.hits += 1
+        return True, None if lat is None else (lat, lng)
+
+    def put(self, address: str, coords: tuple[float, float] | None) -> None:
+        """Store a geocoder result (None = the geocoder found no match)."""
+        lat, lng = coords if coords else (None, None)
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocodes (address, lat, lng, fetched_at) VALUES (?, ?, ?, ?)",
+                (normalize_address(address), lat, lng, time.time()),
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> GeocodeCache:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -1,45 +1,160 @@
 """
 Geocode gyms missing lat/lng coordinates.
 
-Uses the free US Census Geocoder (no API key required).
-Falls back to constructing a full address string for batch upload.
+Uses the free US Census Geocoder (no API key required). Addresses are
+submitted to the batch endpoint as CSV chunks of up to 10,000; anything the
+batch could not match falls back to one-line lookups. Results (including
+"no match") are kept in a persistent cache, see geocache.py, which is
+checked before any network call. Gyms still without coordinates (or with
+no street address at all) get an approximate ZIP/city centroid from the
+offline index in centroids.py, marked with `geo_precision`.
 """
 
 from __future__ import annotations
 
+import csv
+import io
 import time
-from typing import Optional, Tuple
+from urllib.parse import urlsplit
+from typing import Iterable, Iterator, Optional, Tuple
 
 import requests
-from tqdm import tqdm
 
-from config import USER_AGENT
+from config import GEOCODE_CONCURRENCY, GEOCODE_TIMEOUT, GEOCODE_SLOW_SECONDS
+from pipeline.centroids import CentroidIndex
+from pipeline.geocache import GeocodeCache
+from scrapers.client import get_session, host_limiter
+from scrapers.throttle import LatencyStats, fetch_concurrently
 
 CENSUS_GEOCODER_URL = "https://geocoding.geo.census.gov/geocoder/locations/onelineaddress"
+CENSUS_BATCH_URL = "https://geocoding.geo.census.gov/geocoder/locations/addressbatch"
+CENSUS_BENCHMARK = "Public_AR_Current"
+
+BATCH_MAX_ADDRESSES = 10_000  # Census batch endpoint limit per upload
+BATCH_TIMEOUT = 900  # seconds; a full batch can take several minutes
+
+STREAM_CHUNK_SIZE = 1000  # records buffered per geocode_stream chunk
 
 
 def _geocode_single(address: str, session: requests.Session) -> tuple[float, float] | None:
-    """Geocode a single address via the US Census Geocoder."""
+    """Geocode a single address via the US Census Geocoder.
+
+    Returns None if the geocoder found no match. Raises on network errors
+    and malformed responses so they are not mistaken for (and cached as)
+    "no match".
+    """
     params = {
         "address": address,
-        "benchmark": "Public_AR_Current",
+        "benchmark": CENSUS_BENCHMARK,
         "format": "json",
     }
-    try:
-        resp = session.get(CENSUS_GEOCODER_URL, params=params, timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-
-        matches = data.get("result", {}).get("addressMatches", [])
-        if matches:
-            coords = matches[0]["coordinates"]
-            return (float(coords["y"]), float(coords["x"]))  # lat, lng
-    except (requests.RequestException, KeyError, ValueError, IndexError):
-        pass
+    resp = session.get(CENSUS_GEOCODER_URL, params=params, timeout=GEOCODE_TIMEOUT)
+    resp.raise_for_status()
+    data = resp.json()
 
+    matches = data.get("result", {}).get("addressMatches", [])
+    if matches:
+        coords = matches[0]["coordinates"]
+        return (float(coords["y"]), float(coords["x"]))  # lat, lng
     return None
 
 
+def _geocode_batch(rows: list[tuple], session: requests.Session) -> dict[str, tuple[float, float]]:
+    """Submit one CSV batch to the Census batch geocoder.
+
+    Args:
+        rows: (id, street, city, state, zip) tuples, at most BATCH_MAX_ADDRESSES.
+
+    Returns id → (lat, lng) for the rows that matched.
+    """
+    upload = io.StringIO()
+    csv.writer(upload).writerows(rows)
+    resp = session.post(
+        CENSUS_BATCH_URL,
+        data={"benchmark": CENSUS_BENCHMARK},
+        files={"addressFile": ("addresses.csv", upload.getvalue(), "text/csv")},
+        timeout=BATCH_TIMEOUT,
+    )
+    resp.raise_for_status()
+
+    # id, input address, Match/No_Match/Tie, Exact/Non_Exact, matched address, "lng,lat", ...
+    matches = {}
+    for row in csv.reader(io.StringIO(resp.text)):
+        if len(row) >= 6 and row[2] == "Match":
+            try:
+                lng, lat = row[5].split(",")
+                matches[row[0]] = (float(lat), float(lng))
+            except ValueError:
+                continue
+    return matches
+
+
+def _geocode_batches(
+    addresses: dict[str, dict], session: requests.Session
+) -> dict[str, tuple[float, float]]:
+    """Batch-geocode addresses in CSV chunks.
+
+    Args:
+        addresses: Address string → a gym with that address (for the street,
+            city, state and zip columns). Gyms without a street are skipped.
+
+    Returns address string → (lat, lng) for every match. A chunk that fails
+    to upload is skipped, leaving its addresses to the one-line fallback.
+    """
+    rows = [
+        (str(i), gym["address"], gym.get("city") or "", gym.get("state") or "", gym.get("zip") or "")
+        for i, gym in enumerate(addresses.values())
+        if gym.get("address")
+    ]
+    keys = list(addresses)
+
+    found = {}
+    for start in range(0, len(rows), BATCH_MAX_ADDRESSES):
+        chunk = rows[start : start + BATCH_MAX_ADDRESSES]
+        print(f"  Batch geocoding {len(chunk)} addresses...")
+        try:
+            matches = _geocode_batch(chunk, session)
+        except requests.RequestException as e:
+            print(f"  [WARN] Batch upload failed ({e}), falling back to single lookups")
+            continue
+        for row_id, coords in matches.items():
+            found[keys[int(row_id)]] = coords
+        print(f"  Batch matched {len(matches)}/{len(chunk)}")
+    return found
+
+
+def _geocode_concurrently(
+    addresses: list[str], session: requests.Session, concurrency: int
+) -> dict[str, tuple[float, float] | None]:
+    """One-line lookups with `concurrency` requests in flight.
+
+    The shared per-host limiter paces requests and backs off on 429/5xx;
+    responses slower than GEOCODE_SLOW_SECONDS count as pushback too.
+    Returns address → coords (None = no match); failed lookups are left out.
+    """
+    limiter = host_limiter(urlsplit(CENSUS_GEOCODER_URL).netloc)
+    stats = LatencyStats()
+
+    def _lookup(addr_str: str):
+        start = time.monotonic()
+        try:
+            coords = _geocode_single(addr_str, session)
+            ok = True
+        except (requests.RequestException, KeyError, ValueError, IndexError):
+            coords, ok = None, False  # transient — don't cache
+        elapsed = time.monotonic() - start
+        stats.record(elapsed, ok)
+        if elapsed > GEOCODE_SLOW_SECONDS:
+            limiter.on_pushback()
+        return ok, coords
+
+    outcomes = fetch_concurrently(
+        _lookup, addresses, max_workers=concurrency, desc="Geocoding", default=(False, None)
+    )
+    print(f"  Single lookups: {stats.summary()}")
+    return {a: coords for a, (ok, coords) in zip(addresses, outcomes) if ok}
+
+
 def _build_address_string(gym: dict) -> str | None:
     """Build a full address string for geocoding."""
     parts = []
@@ -55,11 +170,30 @@ def _build_address_string(gym: dict) -> str | None:
     return ", ".join(parts) if len(parts) >= 2 else None
 
 
-def geocode_missing(gyms: list[dict]) -> list[dict]:
+def geocode_missing(
+    gyms: list[dict],
+    use_cache: bool = True,
+    batch: bool = True,
+    centroids: bool = True,
+    concurrency: int = GEOCODE_CONCURRENCY,
+) -> list[dict]:
     """Geocode gyms that are missing lat/lng.
 
-    Uses the free US Census Geocoder API (no API key needed).
-    Rate-limited to ~1 request per second.
+    Uses the free US Census Geocoder API (no API key needed). Cached
+    addresses are resolved first, the rest go to the batch endpoint, and
+    only what the batch didn't match is looked up one by one, a few at a
+    time under the adaptive per-host rate limit. Whatever is left gets a
+    ZIP or city centroid.
+
+    Sets `geo_precision` on every gym it fills: "address" for geocoder
+    matches, "zip" or "city" for centroids.
+
+    Args:
+        gyms: Records to fill in place.
+        use_cache: Read and write the persistent geocode cache.
+        batch: Use the Census batch endpoint before single lookups.
+        centroids: Fall back to the offline centroid index (if built).
+        concurrency: One-line lookups in flight at once.
     """
     needs_geocoding = [g for g in gyms if not (g.get("lat") and g.get("lng"))]
     already_have = len(gyms) - len(needs_geocoding)
@@ -69,27 +203,84 @@ def geocode_missing(gyms: list[dict]) -> list[dict]:
     if not needs_geocoding:
         return gyms
 
-    session = requests.Session()
-    session.headers.update({"User-Agent": USER_AGENT})
+    index = CentroidIndex() if centroids else None
+    if index is not None and not index.available:
+        print("  [INFO] No centroid index; build it with `python -m pipeline.centroids`")
+        index = None
 
-    success = 0
-    failed = 0
-
-    for gym in tqdm(needs_geocoding, desc="Geocoding"):
+    # Several gyms can share an address; look each address up once. Without
+    # a street the geocoder can't match, so those go straight to centroids.
+    by_address: dict[str, list[dict]] = {}
+    for gym in needs_geocoding:
         addr_str = _build_address_string(gym)
-        if not addr_str:
-            failed += 1
-            continue
+        if addr_str and (gym.get("address") or index is None):
+            by_address.setdefault(addr_str, []).append(gym)
+
+    # Results live in the geocode cache, so skip the HTTP response cache
+    session = get_session(pool_size=concurrency, cache=False)
+    cache = GeocodeCache() if use_cache else None
+    results: dict[str, tuple[float, float] | None] = {}
 
-        coords = _geocode_single(addr_str, session)
+    try:
+        pending = []
+        for addr_str in by_address:
+            found, coords = cache.get(addr_str) if cache else (False, None)
+            if found:
+                results[addr_str] = coords
+            else:
+                pending.append(addr_str)
+
+        if batch and pending:
+            matched = _geocode_batches({a: by_address[a][0] for a in pending}, session)
+            for addr_str, coords in matched.items():
+                results[addr_str] = coords
+                if cache:
+                    cache.put(addr_str, coords)
+            pending = [a for a in pending if a not in matched]
+
+        if pending:
+            looked_up = _geocode_concurrently(pending, session, concurrency)
+            for addr_str, coords in looked_up.items():
+                results[addr_str] = coords
+                if cache:
+                    cache.put(addr_str, coords)
+    finally:
+        if cache:
+            cache.close()
+
+    success = 0
+    for addr_str, group in by_address.items():
+        coords = results.get(addr_str)
         if coords:
-            gym["lat"] = coords[0]
-            gym["lng"] = coords[1]
-            success += 1
+            for gym in group:
+                gym["lat"], gym["lng"] = coords
+                gym["geo_precision"] = "address"
+                success += 1
+
+    approximate = 0
+    failed = 0
+    for gym in needs_geocoding:
+        if gym.get("lat") and gym.get("lng"):
+            continue
+        centroid = index.lookup(gym) if index else None
+        if centroid:
+            gym["lat"], gym["lng"], gym["geo_precision"] = centroid
+            approximate += 1
         else:
             failed += 1
 
-        time.sleep(1.0)  # Census API rate limit
-
-    print(f"  Geocoded: {success} success, {failed} failed")
+    hits = f" ({cache.hits} from cache)" if cache else ""
+    print(f"  Geocoded: {success} success{hits}, {approximate} approximate (ZIP/city centroid), {failed} failed")
     return gyms
+
+
+def geocode_stream(gyms: Iterable[dict], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[dict]:
+    """Geocode a stream of gyms in bounded chunks, yielding them in order."""
+    chunk = []
+    for gym in gyms:
+        chunk.append(gym)
+        if len(chunk) >= chunk_size:
+            yield from geocode_missing(chunk)
+            chunk = []
+    if chunk:
+        yield from geocode_missing(chunk)
@@ -8,9 +8,14 @@ affiliations from gym names.
 from __future__ import annotations
 
 import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
 
 from config import PRIORITY_AFFILIATIONS
 
+# Records per task when normalize_all runs in a process pool
+NORMALIZE_CHUNK_SIZE = 5_000
+
 # Common name variations to normalize
 NAME_SUBSTITUTIONS = {
     "brazilian jiu-jitsu": "bjj",
@@ -40,11 +45,68 @@ AFFILIATION_PATTERNS = [
 ]
 
 
+def _affiliation_pattern(affiliation: str) -> str:
+    """Default pattern for an affiliation without a hand-written one:
+    its words in order, any spacing between them."""
+    words = [re.escape(w) for w in affiliation.lower().split()]
+    return r"\b" + r"\s*".join(words) + r"\b"
+
+
+class AffiliationMatcher:
+    """All affiliation patterns compiled into one regex.
+
+    Each pattern is a named group inside a lookahead anchored at word
+    starts, so one `finditer` pass visits every word and reports, at each
+    one, the highest-priority pattern that matches there. The lowest index
+    seen is the same answer as trying each pattern in order.
+    """
+
+    def __init__(self, patterns: list[tuple[str, str]]):
+        """
+        Args:
+            patterns: (regex, affiliation) pairs, highest priority first.
+                Every regex must start with a word boundary.
+        """
+        self.labels = [affiliation for _, affiliation in patterns]
+        groups = "|".join(f"(?P<a{i}>{pattern})" for i, (pattern, _) in enumerate(patterns))
+        self.regex = re.compile(rf"\b(?={groups})")
+        # Group number → priority (patterns may contain groups of their own)
+        self._priority = {self.regex.groupindex[f"a{i}"]: i for i in range(len(patterns))}
+
+    def match(self, name_lower: str) -> str | None:
+        """Highest-priority affiliation in an already-lowercased name."""
+        best = None
+        for m in self.regex.finditer(name_lower):
+            i = self._priority[m.lastindex]
+            if best is None or i < best:
+                best = i
+                if i == 0:
+                    break
+        return None if best is None else self.labels[best]
+
+
+def _affiliation_table() -> list[tuple[str, str]]:
+    """AFFILIATION_PATTERNS plus a default pattern for every priority
+    affiliation that doesn't have one yet (lowest priority, in order)."""
+    known = {affiliation for _, affiliation in AFFILIATION_PATTERNS}
+    extra = [(_affiliation_pattern(a), a) for a in PRIORITY_AFFILIATIONS if a not in known]
+    return AFFILIATION_PATTERNS + extra
+
+
+AFFILIATION_MATCHER = AffiliationMatcher(_affiliation_table())
+
+
+# Compiled once at import instead of looked up in re's cache per call
+_NON_DIGITS = re.compile(r"\D")
+
+BJJ_STYLES = frozenset({"bjj", "no-gi", "gracie jiu jitsu", "jiu jitsu"})
+
+
 def normalize_phone(phone: str | None) -> str | None:
     """Strip phone to digits only, return None if invalid."""
     if not phone:
         return None
-    digits = re.sub(r"\D", "", phone)
+    digits = phone if phone.isdecimal() else _NON_DIGITS.sub("", phone)
     # US numbers: strip leading 1 if 11 digits
     if len(digits) == 11 and digits.startswith("1"):
         digits = digits[1:]
@@ -61,11 +123,7 @@ def normalize_state(state: str | None) -> str | None:
 
 def infer_affiliation(name: str) -> str | None:
     """Try to detect affiliation from gym name."""
-    name_lower = name.lower()
-    for pattern, affiliation in AFFILIATION_PATTERNS:
-        if re.search(pattern, name_lower):
-            return affiliation
-    return None
+    return AFFILIATION_MATCHER.match(name.lower())
 
 
 def normalize_name(name: str) -> str:
@@ -73,80 +131,154 @@ def normalize_name(name: str) -> str:
     if not name:
         return ""
     # Fix common encoding issues
-    name = name.replace("&amp;", "&").replace("&#39;", "'")
-    # Collapse whitespace
-    name = re.sub(r"\s+", " ", name).strip()
-    return name
+    if "&" in name:
+        name = name.replace("&amp;", "&").replace("&#39;", "'")
+    # Collapse whitespace (str.split() uses the same whitespace set as \s)
+    return " ".join(name.split())
+
+
+# Field normalizers, each updating one record in place. normalize_gym runs
+# them per record; normalize_batch runs each over the whole list in turn.
+
+def _normalize_name_field(record: dict) -> None:
+    record["name"] = normalize_name(record.get("name", ""))
 
 
-def normalize_gym(gym: dict) -> dict:
-    """Normalize a single gym record."""
-    result = {**gym}
+def _normalize_state_field(record: dict) -> None:
+    record["state"] = normalize_state(record.get("state"))
 
-    # Name
-    result["name"] = normalize_name(result.get("name", ""))
 
-    # State
-    result["state"] = normalize_state(result.get("state"))
+def _normalize_phone_field(record: dict) -> None:
+    record["phone"] = normalize_phone(record.get("phone"))
 
-    # Phone
-    result["phone"] = normalize_phone(result.get("phone"))
 
-    # Affiliation — infer from name if not already set
-    if not result.get("affiliation") and result.get("name"):
-        result["affiliation"] = infer_affiliation(result["name"])
+def _infer_affiliation_field(record: dict) -> None:
+    # Infer from name if not already set
+    if not record.get("affiliation") and record.get("name"):
+        record["affiliation"] = infer_affiliation(record["name"])
 
+
+def _normalize_numbers(record: dict) -> None:
     # Rating — convert to float
-    if result.get("rating"):
+    if record.get("rating"):
         try:
-            result["rating"] = round(float(result["rating"]), 1)
+            record["rating"] = round(float(record["rating"]), 1)
         except (ValueError, TypeError):
-            result["rating"] = None
+            record["rating"] = None
 
     # Review count — convert to int
-    if result.get("review_count"):
+    if record.get("review_count"):
         try:
-            result["review_count"] = int(result["review_count"])
+            record["review_count"] = int(record["review_count"])
         except (ValueError, TypeError):
-            result["review_count"] = None
+            record["review_count"] = None
 
     # Lat/lng — convert to float
     for coord in ("lat", "lng"):
-        if result.get(coord):
+        if record.get(coord):
             try:
-                result[coord] = float(result[coord])
+                record[coord] = float(record[coord])
             except (ValueError, TypeError):
-                result[coord] = None
+                record[coord] = None
+
 
-    # Website — ensure https
-    if result.get("website"):
-        w = result["website"].strip()
+def _normalize_website_field(record: dict) -> None:
+    # Ensure https
+    website = record.get("website")
+    if website:
+        w = website.strip()
         if w and not w.startswith(("http://", "https://")):
             w = "https://" + w
-        result["website"] = w
+        record["website"] = w
+
 
+def _tag_bjj(record: dict) -> None:
     # Styles — ensure list
-    if result.get("styles") and isinstance(result["styles"], str):
-        result["styles"] = [s.strip() for s in result["styles"].split(",")]
+    styles = record.get("styles")
+    if styles and isinstance(styles, str):
+        styles = record["styles"] = [s.strip() for s in styles.split(",")]
 
-    # Filter out non-BJJ gyms (must have bjj or jiu jitsu related style)
-    styles = result.get("styles", [])
+    # Filter out non-BJJ gyms (must have bjj or jiu jitsu related style).
+    # No styles listed — assume BJJ since it came from a BJJ directory.
     if styles:
-        bjj_styles = {"bjj", "no-gi", "gracie jiu jitsu", "jiu jitsu"}
-        if not any(s.lower() in bjj_styles for s in styles):
-            result["_is_bjj"] = False
-        else:
-            result["_is_bjj"] = True
+        record["_is_bjj"] = any(s.lower() in BJJ_STYLES for s in styles)
     else:
-        # No styles listed — assume BJJ since it came from a BJJ directory
-        result["_is_bjj"] = True
+        record["_is_bjj"] = True
+
+
+_FIELD_STEPS = (
+    _normalize_name_field,
+    _normalize_state_field,
+    _normalize_phone_field,
+    _infer_affiliation_field,
+    _normalize_numbers,
+    _normalize_website_field,
+    _tag_bjj,
+)
 
+
+def normalize_gym(gym: dict, in_place: bool = False) -> dict:
+    """Normalize a single gym record.
+
+    Args:
+        gym: Raw record.
+        in_place: Update `gym` itself instead of a copy (for callers that
+            don't need the raw record afterwards).
+    """
+    result = gym if in_place else {**gym}
+    for step in _FIELD_STEPS:
+        step(result)
     return result
 
 
-def normalize_all(gyms: list[dict]) -> list[dict]:
-    """Normalize a list of gym records and filter non-BJJ."""
-    normalized = [normalize_gym(g) for g in gyms]
-    bjj_only = [g for g in normalized if g.pop("_is_bjj", True)]
+def normalize_batch(gyms: list[dict], in_place: bool = False) -> list[dict]:
+    """Normalize a list of records one field at a time.
+
+    Same records as `normalize_gym` on each (including the `_is_bjj` tag),
+    with each field normalizer run over the whole list in turn.
+
+    Args:
+        gyms: Raw records.
+        in_place: Update the records themselves instead of copies.
+    """
+    records = gyms if in_place else [{**g} for g in gyms]
+    for step in _FIELD_STEPS:
+        for record in records:
+            step(record)
+    return records
+
+
+def iter_normalized(gyms: Iterable[dict], in_place: bool = False) -> Iterator[dict]:
+    """Normalize gym records lazily, dropping non-BJJ gyms."""
+    for gym in gyms:
+        result = normalize_gym(gym, in_place=in_place)
+        if result.pop("_is_bjj", True):
+            yield result
+
+
+def _normalize_chunk(gyms: list[dict]) -> list[dict]:
+    """Normalize records in place and keep only the BJJ gyms.
+
+    Runs in pool workers, so filtered-out records are never sent back.
+    """
+    return [g for g in normalize_batch(gyms, in_place=True) if g.pop("_is_bjj", True)]
+
+
+def normalize_all(gyms: list[dict], in_place: bool = False, workers: int = 1) -> list[dict]:
+    """Normalize a list of gym records and filter non-BJJ.
+
+    Args:
+        gyms: Raw records.
+        in_place: Normalize the raw records themselves instead of copies
+            (ignored with workers > 1, which work on pickled copies).
+        workers: Normalize chunks of NORMALIZE_CHUNK_SIZE records across
+            this many processes. Output order matches the input.
+    """
+    if workers > 1 and len(gyms) > NORMALIZE_CHUNK_SIZE:
+        chunks = [gyms[i : i + NORMALIZE_CHUNK_SIZE] for i in range(0, len(gyms), NORMALIZE_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            bjj_only = [g for chunk in pool.map(_normalize_chunk, chunks) for g in chunk]
+    else:
+        bjj_only = _normalize_chunk(gyms if in_place else [{**g} for g in gyms])
     print(f"  Normalized {len(gyms)} → {len(bjj_only)} BJJ gyms")
     return bjj_only
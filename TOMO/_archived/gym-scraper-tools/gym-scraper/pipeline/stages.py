@@ -0,0 +1,116 @@
+"""
+Stage DAG with per-stage output caching for `run.py process`.
+
+Each stage names the stages it reads and the modules its behaviour comes
+from. Its cache key hashes the upstream stages' keys, the source of those
+modules and any extra key data (e.g. raw file contents), so keys are known
+before anything runs. A stage whose key has a cached output in
+data/stage_cache/ is read back instead of re-run, and upstream outputs are
+only loaded when a stage that needs them actually runs.
+
+Editing NAME_SIMILARITY_THRESHOLD in pipeline/deduplicate.py, for example,
+changes the dedupe key (and so every key after it), while normalize is
+still served from the cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from config import STAGE_CACHE_DIR, STAGE_CACHE_KEEP
+from pipeline.stream import iter_records, write_jsonl
+from scrapers.manifest import content_hash
+
+
+class Stage(NamedTuple):
+    name: str
+    # Called with the outputs of `inputs`, in order; returns the records
+    run: Callable[..., list[dict]]
+    inputs: tuple[str, ...] = ()
+    # Modules whose source code determines the output
+    modules: tuple[str, ...] = ()
+    # Anything else the output depends on (file contents, settings)
+    key_data: str = ""
+    # Off for cheap stages (loading raw files) and ones whose output depends
+    # on more than their key (network lookups)
+    cache: bool = True
+
+
+def module_version(names: tuple[str, ...]) -> str:
+    """Hash of the named modules' source files."""
+    h = hashlib.sha1()
+    for name in names:
+        h.update(Path(importlib.import_module(name).__file__).read_bytes())
+    return h.hexdigest()
+
+
+def files_version(paths: list[Path]) -> str:
+    """Hash of the files' names and contents."""
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(path.name.encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class StageRunner:
+    """Run a list of stages in order, reusing cached outputs where keys match."""
+
+    def __init__(self, stages: list[Stage], use_cache: bool = True, cache_dir: Path = STAGE_CACHE_DIR):
+        """
+        Args:
+            stages: Stages in dependency order (inputs before consumers).
+            use_cache: Read cached outputs; fresh outputs are stored either way.
+            cache_dir: Where stage outputs are stored.
+        """
+        self.stages = {s.name: s for s in stages}
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.keys: dict[str, str] = {}
+        for stage in stages:
+            missing = [i for i in stage.inputs if i not in self.keys]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} reads {missing} before they are defined")
+            self.keys[stage.name] = content_hash([
+                stage.name,
+                [self.keys[i] for i in stage.inputs],
+                module_version(stage.modules),
+                stage.key_data,
+            ])
+        self._outputs: dict[str, list[dict]] = {}
+
+    def _path(self, name: str) -> Path:
+        return self.cache_dir / f"{name}-{self.keys[name][:16]}.jsonl"
+
+    def output(self, name: str) -> list[dict]:
+        """Output of a stage: in memory, from the cache, or by running it."""
+        if name in self._outputs:
+            return self._outputs[name]
+
+        stage = self.stages[name]
+        path = self._path(name)
+        if stage.cache and self.use_cache and path.exists():
+            records = list(iter_records(path))
+            print(f"  [{name}] cached: {len(records)} records from {path.name}")
+        else:
+            args = [self.output(i) for i in stage.inputs]
+            start = time.perf_counter()
+            records = stage.run(*args)
+            print(f"  [{name}] ran in {time.perf_counter() - start:.1f}s")
+            if stage.cache:
+                write_jsonl(path, records)
+                self._evict(name)
+        self._outputs[name] = records
+        return records
+
+    def _evict(self, name: str) -> None:
+        """Keep only the newest STAGE_CACHE_KEEP outputs of a stage."""
+        old = sorted(self.cache_dir.glob(f"{name}-*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in old[STAGE_CACHE_KEEP:]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,172 @@
+"""
+Streaming I/O for raw and processed gym records.
+
+Raw scraper output is JSONL (one record per line) so it can be read and
+written one record at a time. Legacy `.json` list files are still readable.
+Processed outputs stay plain JSON arrays for compatibility, but are written
+incrementally via `JsonArrayWriter`. They can also be written as a compact
+msgpack stream (`CompactWriter`, needs the optional `msgpack` package)
+that is several times smaller and faster to read.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from config import TABLE_FIELDS
+
+COMPACT_SUFFIX = ".msgpack"
+COMPACT_FIELDS = tuple(sorted(TABLE_FIELDS))
+
+
+def write_jsonl(path: Path, records: Iterable[dict]) -> int:
+    """Write records as JSONL, atomically. Returns the record count."""
+    tmp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+    count = 0
+    with open(tmp, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    os.replace(tmp, path)
+    return count
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Yield records from a JSONL, compact msgpack or legacy JSON list file."""
+    if path.suffix == COMPACT_SUFFIX:
+        yield from iter_compact(path)
+        return
+    with open(path) as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+
+def raw_files(directory: Path) -> list[Path]:
+    """Raw files in a directory, preferring `X.jsonl` over a stale `X.json`."""
+    files = {p.stem: p for p in sorted(directory.glob("*.json"))}
+    files.update({p.stem: p for p in sorted(directory.glob("*.jsonl"))})
+    return [files[stem] for stem in sorted(files)]
+
+
+def iter_raw_records(directory: Path) -> Iterator[dict]:
+    """Stream every raw record from a directory, one file at a time."""
+    for path in raw_files(directory):
+        count = 0
+        for record in iter_records(path):
+            count += 1
+            yield record
+        print(f"  Loaded {count} gyms from {path.name}")
+
+
+class JsonArrayWriter:
+    """Write a JSON array one element at a time.
+
+    The file is a normal JSON list, so existing readers (`json.load`) keep
+    working, but the full list is never held in memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._tmp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+        self._file = open(self._tmp, "w")
+        self._file.write("[")
+
+    def write(self, record: dict) -> None:
+        self._file.write(",\n" if self.count else "\n")
+        self._file.write(json.dumps(record, indent=2))
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self) -> JsonArrayWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            self._tmp.unlink(missing_ok=True)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError("Compact output needs msgpack: pip install msgpack") from e
+    return msgpack
+
+
+class CompactWriter:
+    """Write records as a msgpack stream with a fixed field schema.
+
+    The first object is a header naming the schema fields (the gyms table
+    columns by default). Each record follows as
+    `[presence bitmask, values of the present schema fields, extras]`,
+    where extras maps any other keys (None when there are none), so field
+    names aren't repeated per record and absent vs null is preserved.
+    """
+
+    def __init__(self, path: Path, fields: Iterable[str] = COMPACT_FIELDS):
+        msgpack = _msgpack()
+        self.path = path
+        self.count = 0
+        self.fields = list(fields)
+        self._known = set(self.fields)
+        self._packer = msgpack.Packer()
+        self._tmp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+        self._file = open(self._tmp, "wb")
+        self._file.write(self._packer.pack({"fields": self.fields}))
+
+    def write(self, record: dict) -> None:
+        mask, values = 0, []
+        for i, field in enumerate(self.fields):
+            if field in record:
+                mask |= 1 << i
+                values.append(record[field])
+        extras = {k: v for k, v in record.items() if k not in self._known} or None
+        self._file.write(self._packer.pack([mask, values, extras]))
+        self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self) -> CompactWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            self._tmp.unlink(missing_ok=True)
+
+
+def iter_compact(path: Path) -> Iterator[dict]:
+    """Yield records from a `CompactWriter` file."""
+    msgpack = _msgpack()
+    with open(path, "rb") as f:
+        unpacker = msgpack.Unpacker(f, raw=False)
+        fields = next(unpacker)["fields"]
+        names_by_mask: dict[int, tuple[str, ...]] = {}
+        for mask, values, extras in unpacker:
+            # Records mostly share a handful of field sets; resolve each once
+            names = names_by_mask.get(mask)
+            if names is None:
+                names = names_by_mask[mask] = tuple(f for i, f in enumerate(fields) if mask >> i & 1)
+            record = dict(zip(names, values))
+            if extras:
+                record.update(extras)
+            yield record
@@ -9,126 +9,410 @@ Usage:
     python run.py upload           # Upload processed data to Supabase
     python run.py all              # Full pipeline + upload to Supabase
     python run.py test             # Quick test: scrape 2 states only (TX, CA)
+
+Flags (scrape/test/all):
+    --offline                      # Replay cached responses, no network
+    --no-cache                     # Bypass the HTTP response cache
+    --incremental                  # Only fetch new/changed/stale gyms; process + upload the delta
+    --workers N                    # Shard state-based scrapers across N processes (resumable)
+
+Flags (process/upload):
+    --delta                        # Use only the new/changed gyms from the last scrape
+    --stream                       # process: generator pipeline with bounded memory
+                                   #   (dedupes per state: gyms in different states never merge)
+                                   #   (with `all`, records are uploaded as they come out)
+    --workers N                    # process: normalize chunks and dedupe blocks across N processes
+    --compact                      # process: also write .msgpack copies of the outputs
+                                   # upload: read the .msgpack copy instead of the JSON
+    --fresh                        # process: re-run every stage instead of reusing cached outputs
+    --full                         # upload: upsert every row, not just those changed since the last upload
+    --prune                        # upload: delete rows whose slug is gone (full uploads only)
 """
 
 import json
 import sys
+from contextlib import ExitStack
 from datetime import datetime, timezone
+from typing import Iterator
 
-from config import RAW_DIR, MERGED_DIR, READY_DIR
+from config import RAW_DIR, MERGED_DIR, READY_DIR, DELTA_DIR, US_STATES
 
 
-def scrape(test_mode: bool = False, source: str = "all"):
+def scrape(
+    test_mode: bool = False,
+    source: str = "all",
+    offline: bool = False,
+    use_cache: bool = True,
+    incremental: bool = False,
+    workers: int = 1,
+):
     """Run scrapers and save raw data.
 
     Args:
         test_mode: If True, only scrape a small subset.
         source: Which scraper to run — "bjjmetrics", "jiujitsu", "10thplanet", or "all".
+        offline: Replay responses from the HTTP cache without network access.
+        use_cache: Revalidate against / store into the HTTP cache.
+        incremental: Only fetch detail pages for new, changed or stale gyms.
+        workers: If > 1, shard the per-state scrapers across this many
+            processes and merge their outputs.
     """
-    if source in ("all", "bjjmetrics"):
-        from scrapers.bjjmetrics import run as bjjmetrics_run
-        states = ["TX", "CA"] if test_mode else None
-        bjjmetrics_run(states=states)
+    from scrapers.client import configure_cache
+    cache = configure_cache(enabled=use_cache, offline=offline)
 
+    # Each scrape produces a fresh delta
+    for old in [*DELTA_DIR.glob("*.json"), *DELTA_DIR.glob("*.jsonl")]:
+        old.unlink()
+
+    source_states = {}
+    if source in ("all", "bjjmetrics"):
+        source_states["bjjmetrics"] = ["TX", "CA"] if test_mode else US_STATES
     if source in ("all", "jiujitsu"):
-        from scrapers.jiujitsu_com import run as jiujitsu_run
-        states = ["PA"] if test_mode else None
-        jiujitsu_run(states=states)
+        source_states["jiujitsu"] = ["PA"] if test_mode else US_STATES
+
+    if workers > 1 and source_states:
+        from scrapers.sharding import run_sharded
+        run_sharded(
+            source_states, workers,
+            incremental=incremental, use_cache=use_cache, offline=offline,
+        )
+    else:
+        if "bjjmetrics" in source_states:
+            from scrapers.bjjmetrics import run as bjjmetrics_run
+            bjjmetrics_run(states=source_states["bjjmetrics"], incremental=incremental)
+
+        if "jiujitsu" in source_states:
+            from scrapers.jiujitsu_com import run as jiujitsu_run
+            jiujitsu_run(states=source_states["jiujitsu"], incremental=incremental)
 
     if source in ("all", "10thplanet"):
         from scrapers.tenth_planet import run as tenth_planet_run
         tenth_planet_run()
 
+    if cache is not None and not offline:
+        removed = cache.evict()
+        if removed:
+            print(f"  HTTP cache: evicted {removed} stale entries")
 
-def process():
-    """Process raw scraped data through the pipeline."""
-    from pipeline.normalize import normalize_all
-    from pipeline.deduplicate import deduplicate
-    from pipeline.geocode import geocode_missing
 
-    # Load raw data from all sources
-    all_gyms = []
-    for raw_file in RAW_DIR.glob("*.json"):
-        with open(raw_file) as f:
-            data = json.load(f)
-            print(f"  Loaded {len(data)} gyms from {raw_file.name}")
-            all_gyms.extend(data)
+def process(
+    delta: bool = False,
+    stream: bool = False,
+    workers: int = 1,
+    upload: dict | None = None,
+    compact: bool = False,
+    use_stage_cache: bool = True,
+):
+    """Process raw scraped data through the pipeline.
+
+    Args:
+        delta: Process only the new/changed gyms from the last scrape
+            (data/delta/) and write gyms_delta.json instead of gyms.json.
+            They are merged into the clusters of the last full run
+            (data/merged/gyms_merged.json), whose rebuilt rows make up
+            the delta output.
+        stream: Run the pipeline as generators with bounded memory and
+            write outputs incrementally. Returns the record count instead
+            of the list.
+        workers: Normalize chunks and dedupe (state, city) blocks across
+            this many processes.
+        upload: With stream, also upload each finalized record to Supabase
+            as it comes out, passing these options to `upload.upload`.
+        compact: Also write the merged and ready outputs as compact
+            .msgpack files next to the JSON (needs msgpack).
+        use_stage_cache: Reuse normalize/dedupe outputs whose raw inputs
+            and code are unchanged (see pipeline/stages.py).
+    """
+    from pipeline.stream import raw_files
+
+    input_dir = DELTA_DIR if delta else RAW_DIR
+    suffix = "_delta" if delta else ""
 
-    if not all_gyms:
+    if not raw_files(input_dir):
         print("ERROR: No raw data found. Run 'python run.py scrape' first.")
         return []
 
-    print(f"\n--- Normalize ---")
-    gyms = normalize_all(all_gyms)
+    if stream:
+        return _process_stream(input_dir, suffix, workers, upload, compact)
 
-    print(f"\n--- Deduplicate ---")
-    gyms = deduplicate(gyms)
-
-    print(f"\n--- Geocode missing coordinates ---")
-    gyms = geocode_missing(gyms)
+    gyms = _run_stages(input_dir, workers, use_stage_cache)
 
     # Save intermediate
-    merged_file = MERGED_DIR / "gyms_merged.json"
-    with open(merged_file, "w") as f:
-        json.dump(gyms, f, indent=2)
+    merged_file = MERGED_DIR / f"gyms_merged{suffix}.json"
+    _save(merged_file, gyms, compact)
     print(f"\n  Saved merged data to {merged_file}")
 
     # Prepare final output
     timestamp = datetime.now(timezone.utc).isoformat()
     for gym in gyms:
-        gym["last_verified"] = timestamp
-        # Clean up internal fields
-        gym.pop("source", None)
-        gym.pop("address_raw", None)
+        _finalize(gym, timestamp)
+
+    ready_file = READY_DIR / f"gyms{suffix}.json"
+    _save(ready_file, gyms, compact)
+
+    stats = _new_stats()
+    for gym in gyms:
+        _count_stats(stats, gym)
+    _print_stats(stats, ready_file)
+
+    return gyms
+
+
+def _run_stages(input_dir, workers: int, use_cache: bool) -> list[dict]:
+    """Normalize → dedupe → geocode as a cached stage DAG; returns geocoded gyms.
+
+    For the delta, dedupe also reads the last full merged set and the raw
+    files (see `_dedupe_delta`), so they are part of its key.
+    """
+    from config import PRIORITY_AFFILIATIONS
+    from pipeline.normalize import normalize_all
+    from pipeline.deduplicate import deduplicate
+    from pipeline.geocode import geocode_missing
+    from pipeline.stages import Stage, StageRunner, files_version
+    from pipeline.stream import iter_raw_records, raw_files
+
+    def normalize(raw):
+        print(f"\n--- Normalize ---")
+        return normalize_all(raw, in_place=True, workers=workers)  # raw records aren't reused
+
+    def dedupe(gyms):
+        print(f"\n--- Deduplicate ---")
+        if delta:
+            return _dedupe_delta(gyms, workers)
+        return deduplicate(gyms, workers=workers)
+
+    def geocode(gyms):
+        print(f"\n--- Geocode missing coordinates ---")
+        return geocode_missing(gyms)
+
+    delta = input_dir == DELTA_DIR
+    dedupe_inputs = [p for p in (MERGED_DIR / "gyms_merged.json",) if p.exists()] + raw_files(RAW_DIR)
+
+    # Load raw data from all sources (only if a later stage has to run)
+    runner = StageRunner([
+        Stage("raw", lambda: list(iter_raw_records(input_dir)),
+              key_data=files_version(raw_files(input_dir)), cache=False),
+        Stage("normalize", normalize, ("raw",),
+              ("pipeline.normalize",), key_data=repr(PRIORITY_AFFILIATIONS)),
+        Stage("dedupe", dedupe, ("normalize",),
+              ("pipeline.deduplicate", "pipeline.candidates", "pipeline.geo"),
+              key_data=files_version(dedupe_inputs) if delta else ""),
+        # Not cached: its output also depends on the Census API, the geocode
+        # cache and data/centroids/, and the geocode cache already makes a
+        # re-run cheap
+        Stage("geocode", geocode, ("dedupe",),
+              ("pipeline.geocode", "pipeline.geocache", "pipeline.centroids"), cache=False),
+    ], use_cache=use_cache)
+    return runner.output("geocode")
 
-    ready_file = READY_DIR / "gyms.json"
-    with open(ready_file, "w") as f:
+
+def _dedupe_delta(gyms: list[dict], workers: int) -> list[dict]:
+    """Dedupe normalized delta records into the last full run's clusters.
+
+    Falls back to deduping the delta on its own when there is no full
+    merged set yet.
+    """
+    from pipeline.deduplicate import deduplicate, deduplicate_delta
+    from pipeline.normalize import iter_normalized
+    from pipeline.stream import iter_raw_records, iter_records
+
+    base_file = MERGED_DIR / "gyms_merged.json"
+    if not base_file.exists():
+        print(f"  [WARN] No {base_file.name} yet (run a full process); deduping the delta on its own")
+        return deduplicate(gyms, workers=workers)
+
+    def load_members(slugs: set[str]) -> Iterator[dict]:
+        # Scrapes write the complete raw set (incremental ones included),
+        # so data/raw/ holds every member's current record
+        raw = (g for g in iter_raw_records(RAW_DIR) if g.get("slug") in slugs)
+        return iter_normalized(raw, in_place=True)
+
+    return deduplicate_delta(gyms, list(iter_records(base_file)), load_members, workers=workers)
+
+
+def _save(path, gyms: list[dict], compact: bool) -> None:
+    """Write an output as indented JSON, plus a .msgpack copy if compact."""
+    from pipeline.stream import COMPACT_SUFFIX, CompactWriter
+    with open(path, "w") as f:
         json.dump(gyms, f, indent=2)
+    if compact:
+        with CompactWriter(path.with_suffix(COMPACT_SUFFIX)) as out:
+            for gym in gyms:
+                out.write(gym)
+    else:
+        # Don't leave an older copy around for `upload --compact` to read
+        path.with_suffix(COMPACT_SUFFIX).unlink(missing_ok=True)
+
+
+def _open_outputs(stack: ExitStack, path, compact: bool) -> list:
+    """Incremental writers for one output: JSON, plus .msgpack if compact."""
+    from pipeline.stream import COMPACT_SUFFIX, CompactWriter, JsonArrayWriter
+    writers = [stack.enter_context(JsonArrayWriter(path))]
+    if compact:
+        writers.append(stack.enter_context(CompactWriter(path.with_suffix(COMPACT_SUFFIX))))
+    else:
+        path.with_suffix(COMPACT_SUFFIX).unlink(missing_ok=True)
+    return writers
+
+
+def _process_stream(
+    input_dir,
+    suffix: str,
+    workers: int = 1,
+    upload_opts: dict | None = None,
+    compact: bool = False,
+) -> int:
+    """Streaming variant of process(): raw JSONL → generators → incremental output.
+
+    With `upload_opts`, finalized records go straight into the uploader's
+    bounded batch queue, so upserts overlap with dedupe and geocoding.
+    """
+    stats = _new_stats()
+    gyms = _iter_processed(input_dir, suffix, workers, stats, compact)
+    if upload_opts is not None:
+        from upload import upload
+        # Written out already, so the uploader may strip records in place
+        upload(gyms, in_place=True, **upload_opts)
+    for _ in gyms:
+        pass  # drain whatever the uploader didn't consume
+    return stats["total"]
+
 
-    # Stats
-    with_coords = sum(1 for g in gyms if g.get("lat") and g.get("lng"))
-    with_affiliation = sum(1 for g in gyms if g.get("affiliation"))
-    with_phone = sum(1 for g in gyms if g.get("phone"))
-    with_website = sum(1 for g in gyms if g.get("website"))
+def _iter_processed(input_dir, suffix: str, workers: int, stats: dict, compact: bool) -> Iterator[dict]:
+    """Yield finalized records as they are written to the merged/ready files."""
+    from pipeline.normalize import iter_normalized
+    from pipeline.deduplicate import deduplicate_stream
+    from pipeline.geocode import geocode_stream
+    from pipeline.stream import iter_raw_records
 
+    print(f"\n--- Normalize → Deduplicate → Geocode (streaming) ---")
+    gyms = iter_normalized(iter_raw_records(input_dir), in_place=True)
+    if input_dir == DELTA_DIR:
+        # Deltas are small; merging them into existing clusters needs them whole
+        gyms = iter(_dedupe_delta(list(gyms), workers))
+    else:
+        gyms = deduplicate_stream(gyms, workers=workers)
+    gyms = geocode_stream(gyms)
+
+    merged_file = MERGED_DIR / f"gyms_merged{suffix}.json"
+    ready_file = READY_DIR / f"gyms{suffix}.json"
+    timestamp = datetime.now(timezone.utc).isoformat()
+
+    with ExitStack() as stack:
+        merged_out = _open_outputs(stack, merged_file, compact)
+        ready_out = _open_outputs(stack, ready_file, compact)
+        for gym in gyms:
+            for out in merged_out:
+                out.write(gym)
+            _finalize(gym, timestamp)
+            for out in ready_out:
+                out.write(gym)
+            _count_stats(stats, gym)
+            yield gym
+
+    print(f"\n  Saved merged data to {merged_file}")
+    _print_stats(stats, ready_file)
+
+
+def _finalize(gym: dict, timestamp: str) -> dict:
+    """Stamp a merged record and strip internal fields for the ready output."""
+    gym["last_verified"] = timestamp
+    # Clean up internal fields
+    gym.pop("source", None)
+    gym.pop("address_raw", None)
+    gym.pop("member_slugs", None)
+    return gym
+
+
+def _new_stats() -> dict:
+    return {"total": 0, "coords": 0, "affiliation": 0, "phone": 0, "website": 0}
+
+
+def _count_stats(stats: dict, gym: dict) -> None:
+    stats["total"] += 1
+    stats["coords"] += bool(gym.get("lat") and gym.get("lng"))
+    stats["affiliation"] += bool(gym.get("affiliation"))
+    stats["phone"] += bool(gym.get("phone"))
+    stats["website"] += bool(gym.get("website"))
+
+
+def _print_stats(stats: dict, ready_file) -> None:
+    total = stats["total"]
     print(f"\n=== Pipeline Complete ===")
-    print(f"  Total gyms:      {len(gyms)}")
-    print(f"  With coords:     {with_coords} ({100*with_coords//max(len(gyms),1)}%)")
-    print(f"  With affiliation: {with_affiliation}")
-    print(f"  With phone:      {with_phone}")
-    print(f"  With website:    {with_website}")
+    print(f"  Total gyms:      {total}")
+    print(f"  With coords:     {stats['coords']} ({100*stats['coords']//max(total,1)}%)")
+    print(f"  With affiliation: {stats['affiliation']}")
+    print(f"  With phone:      {stats['phone']}")
+    print(f"  With website:    {stats['website']}")
     print(f"  Saved to:        {ready_file}")
 
-    return gyms
 
+def upload_to_supabase(delta: bool = False, full: bool = False, prune: bool = False, compact: bool = False):
+    """Upload processed data to Supabase.
 
-def upload_to_supabase():
-    """Upload processed data to Supabase."""
+    Args:
+        delta: Upload gyms_delta.json instead of gyms.json.
+        full: Upsert every row instead of only changed ones.
+        prune: Delete rows whose slug is no longer in the upload. Ignored
+            for deltas, which are not a complete gym set.
+        compact: Read the .msgpack copy written by `process --compact`.
+    """
     from upload import upload
-    upload()
+    upload(
+        file_path=READY_DIR / "gyms_delta.json" if delta else None,
+        full=full,
+        prune=prune and not delta,
+        compact=compact,
+    )
 
 
 def main():
-    args = sys.argv[1:]
+    args = []
+    flags = set()
+    workers = 1
+    argv = iter(sys.argv[1:])
+    for a in argv:
+        if a.startswith("--workers"):
+            workers = int(a.split("=", 1)[1] if "=" in a else next(argv, "1"))
+        elif a.startswith("--"):
+            flags.add(a)
+        else:
+            args.append(a)
     command = args[0] if args else "scrape_and_process"
+    incremental = "--incremental" in flags
+    delta = incremental or "--delta" in flags
+    stream = "--stream" in flags
+    compact = "--compact" in flags
+    use_stage_cache = "--fresh" not in flags
+    upload_opts = {"full": "--full" in flags, "prune": "--prune" in flags}
+    scrape_opts = {
+        "offline": "--offline" in flags,
+        "use_cache": "--no-cache" not in flags,
+        "incremental": incremental,
+        "workers": workers,
+    }
 
     if command == "scrape":
-        scrape()
+        scrape(**scrape_opts)
     elif command == "process":
-        process()
+        process(delta=delta, stream=stream, workers=workers, compact=compact, use_stage_cache=use_stage_cache)
     elif command == "upload":
-        upload_to_supabase()
+        upload_to_supabase(delta=delta, compact=compact, **upload_opts)
     elif command == "all":
-        scrape()
-        process()
-        upload_to_supabase()
+        scrape(**scrape_opts)
+        if stream:
+            upload_opts["prune"] = upload_opts["prune"] and not delta
+            process(delta=delta, stream=True, workers=workers, upload=upload_opts, compact=compact)
+        else:
+            process(delta=delta, workers=workers, compact=compact, use_stage_cache=use_stage_cache)
+            upload_to_supabase(delta=delta, compact=compact, **upload_opts)
     elif command == "test":
-        scrape(test_mode=True)
-        process()
+        scrape(test_mode=True, **scrape_opts)
+        process(stream=stream, workers=workers, compact=compact, use_stage_cache=use_stage_cache)
     else:
         # Default: scrape + process (no upload)
-        scrape()
-        process()
+        scrape(**scrape_opts)
+        process(stream=stream, workers=workers, compact=compact, use_stage_cache=use_stage_cache)
 
 
 if __name__ == "__main__":
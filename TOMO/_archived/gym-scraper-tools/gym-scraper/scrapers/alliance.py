@@ -9,12 +9,14 @@ from __future__ import annotations
 
 import json
 import re
-import time
 
 import requests
 from bs4 import BeautifulSoup
 
-from config import USER_AGENT, REQUEST_DELAY, RAW_DIR
+from config import RAW_DIR
+from pipeline.stream import write_jsonl
+from scrapers.client import get_session
+from scrapers.manifest import Manifest, save_delta
 
 BASE_URL = "https://www.allianceofficial.com"
 AJAX_URL = f"{BASE_URL}/wp-admin/admin-ajax.php"
@@ -40,12 +42,7 @@ PT_STATE_TO_CODE = {
 
 
 def _get_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({
-        "User-Agent": USER_AGENT,
-        "X-Requested-With": "XMLHttpRequest",
-    })
-    return s
+    return get_session({"X-Requested-With": "XMLHttpRequest"})
 
 
 def _parse_school_html(html: str, state_code: str) -> list[dict]:
@@ -178,8 +175,6 @@ def run() -> list[dict]:
         else:
             print(f"  {state_code} ({state_name}): 0 schools")
 
-        time.sleep(REQUEST_DELAY * 0.5)
-
     # Dedupe by slug
     seen = set()
     unique = []
@@ -189,9 +184,13 @@ def run() -> list[dict]:
             unique.append(g)
 
     # Save
-    output_file = RAW_DIR / "alliance.json"
-    with open(output_file, "w") as f:
-        json.dump(unique, f, indent=2)
+    output_file = RAW_DIR / "alliance.jsonl"
+    write_jsonl(output_file, unique)
+
+    manifest = Manifest(SOURCE_NAME)
+    delta = [g for g in unique if manifest.update(g["slug"], g)]
+    manifest.save()
+    save_delta(SOURCE_NAME, delta)
 
     print(f"\nDone! {len(unique)} US Alliance schools saved to {output_file}")
     return unique
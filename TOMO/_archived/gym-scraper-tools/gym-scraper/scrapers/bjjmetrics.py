@@ -10,7 +10,6 @@ from __future__ import annotations
 
 import json
 import re
-import time
 from pathlib import Path
 from typing import Optional
 
@@ -18,16 +17,19 @@ import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
-from config import US_STATES, REQUEST_DELAY, USER_AGENT, RAW_DIR
+from config import US_STATES, RAW_DIR, DELTA_DIR, MAX_CONCURRENCY_PER_HOST
+from pipeline.stream import write_jsonl
+from scrapers.checkpoint import Checkpoint
+from scrapers.client import get_session
+from scrapers.manifest import Manifest, save_delta
+from scrapers.throttle import fetch_concurrently
 
 BASE_URL = "https://bjjmetrics.com"
 SOURCE_NAME = "bjjmetrics"
 
 
-def _get_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({"User-Agent": USER_AGENT})
-    return s
+def _get_session(pool_size: int = MAX_CONCURRENCY_PER_HOST) -> requests.Session:
+    return get_session(pool_size=pool_size)
 
 
 def scrape_state_listing(session: requests.Session, state: str) -> list[dict]:
@@ -147,6 +149,41 @@ def scrape_gym_detail(session: requests.Session, slug: str) -> dict | None:
     return gym if gym.get("name") else None
 
 
+def _finalize_detail(detail: dict, entry: dict) -> dict:
+    """Fill address components and state from the raw detail + listing entry."""
+    # Parse the address into components
+    addr = parse_address(detail.pop("address_raw", ""))
+    detail.update({k: v for k, v in addr.items() if k not in detail or not detail[k]})
+
+    # Use state from listing if detail didn't parse it
+    if not detail.get("state") and entry.get("state"):
+        detail["state"] = entry["state"]
+    return detail
+
+
+def scrape_gym_details(
+    session: requests.Session,
+    entries: list[dict],
+    concurrency: int = MAX_CONCURRENCY_PER_HOST,
+    checkpoint: Checkpoint | None = None,
+) -> list[dict | None]:
+    """Fetch and finalize detail pages for many listing entries in parallel.
+
+    At most `concurrency` requests are in flight; the session's per-host
+    limiter caps the request rate. Each finished record is appended to
+    `checkpoint` as soon as it completes. Results are in `entries` order.
+    """
+    def _fetch(entry: dict) -> dict | None:
+        detail = scrape_gym_detail(session, entry["slug"])
+        if detail:
+            detail = _finalize_detail(detail, entry)
+            if checkpoint is not None:
+                checkpoint.append(detail)
+        return detail
+
+    return fetch_concurrently(_fetch, entries, max_workers=concurrency, desc="Gym details")
+
+
 def parse_address(address_raw) -> dict:
     """Parse a raw address string into components."""
     if not address_raw:
@@ -178,19 +215,35 @@ def parse_address(address_raw) -> dict:
     return result
 
 
-def run(states: list[str] | None = None) -> list[dict]:
+def run(
+    states: list[str] | None = None,
+    concurrency: int = MAX_CONCURRENCY_PER_HOST,
+    incremental: bool = False,
+    output_file: Path | None = None,
+    delta_dir: Path = DELTA_DIR,
+) -> list[dict]:
     """Run the full BJJMetrics scrape.
 
     Args:
         states: List of state codes to scrape. Defaults to all US states.
+        concurrency: Max parallel detail-page requests.
+        incremental: Only fetch detail pages for new, changed or stale
+            slugs; reuse the manifest's records for the rest.
+        output_file: Where to write raw output. Defaults to a batch-labelled
+            file in RAW_DIR.
+        delta_dir: Where to write new/changed records.
 
     Returns:
         List of gym dicts ready for the pipeline.
     """
     states = states or US_STATES
-    session = _get_session()
+    batch_label = "_".join(states[:4]) if len(states) <= 4 else f"{states[0]}_{len(states)}states"
+    session = _get_session(pool_size=concurrency)
+    manifest = Manifest(SOURCE_NAME)
+    checkpoint = Checkpoint(f"bjjmetrics_{batch_label}", key_data=[states, incremental])
     all_gyms = []
     all_slugs = []
+    delta = []
 
     print(f"\n=== BJJMetrics Scraper ===")
     print(f"Scraping {len(states)} states...\n")
@@ -204,7 +257,6 @@ def run(states: list[str] | None = None) -> list[dict]:
                 tqdm.write(f"  {state}: {len(gyms)} gyms")
         except requests.RequestException as e:
             tqdm.write(f"  {state}: ERROR - {e}")
-        time.sleep(REQUEST_DELAY * 0.5)  # Lighter delay for listing pages
 
     # Dedupe slugs (same gym might appear in multiple states somehow)
     seen_slugs = set()
@@ -215,28 +267,48 @@ def run(states: list[str] | None = None) -> list[dict]:
             unique_slugs.append(g)
 
     print(f"\nFound {len(unique_slugs)} unique gyms across {len(states)} states")
-    print(f"Fetching detail pages...\n")
 
-    # Phase 2: Fetch detail pages for each gym
-    for entry in tqdm(unique_slugs, desc="Gym details"):
-        detail = scrape_gym_detail(session, entry["slug"])
+    to_fetch = [e for e in unique_slugs if not incremental or manifest.needs_fetch(e["slug"], e)]
+
+    # Skip detail pages already completed by an interrupted run
+    fetched = checkpoint.load()
+    remaining = [e for e in to_fetch if e["slug"] not in fetched]
+    print(f"Fetching {len(remaining)} detail pages...\n")
+
+    # Phase 2: Fetch detail pages for each gym (parallel, rate-limited)
+    details = scrape_gym_details(session, remaining, concurrency=concurrency, checkpoint=checkpoint)
+    for entry, detail in zip(remaining, details):
+        fetched[entry["slug"]] = detail
+    failed = {e["slug"] for e in to_fetch if not fetched.get(e["slug"])}
+    if failed:
+        print(f"  {len(failed)} detail pages failed; keeping their last good record")
+
+    for entry in to_fetch:
+        detail = fetched.get(entry["slug"])
+        if detail and manifest.update(entry["slug"], detail, entry):
+            delta.append(detail)
+
+    # Keep listing order; unchanged slugs come from the manifest, and so do
+    # failed fetches (or the bare listing entry if there is no record yet)
+    fetched_slugs = {e["slug"] for e in to_fetch} - failed
+    for entry in unique_slugs:
+        if entry["slug"] in fetched_slugs:
+            detail = fetched[entry["slug"]]
+        else:
+            detail = manifest.cached_record(entry["slug"])
+            if detail is None and entry["slug"] in failed:
+                detail = {**entry, "source": SOURCE_NAME}
         if detail:
-            # Parse the address into components
-            addr = parse_address(detail.pop("address_raw", ""))
-            detail.update({k: v for k, v in addr.items() if k not in detail or not detail[k]})
-
-            # Use state from listing if detail didn't parse it
-            if not detail.get("state") and entry.get("state"):
-                detail["state"] = entry["state"]
-
             all_gyms.append(detail)
-        time.sleep(REQUEST_DELAY)
+    manifest.save()
 
     # Save raw output to a batch-specific file to avoid race conditions
-    batch_label = "_".join(states[:4]) if len(states) <= 4 else f"{states[0]}_{len(states)}states"
-    output_file = RAW_DIR / f"bjjmetrics_{batch_label}.json"
-    with open(output_file, "w") as f:
-        json.dump(all_gyms, f, indent=2)
+    if output_file is None:
+        output_file = RAW_DIR / f"bjjmetrics_{batch_label}.jsonl"
+    write_jsonl(output_file, all_gyms)
+    checkpoint.clear()
+
+    save_delta(output_file.stem, delta, delta_dir)
 
     print(f"\nDone! {len(all_gyms)} gyms saved to {output_file}")
     return all_gyms
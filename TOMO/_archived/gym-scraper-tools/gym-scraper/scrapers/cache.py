@@ -0,0 +1,171 @@
+"""
+On-disk HTTP response cache for scrapers.
+
+Layout under CACHE_DIR:
+    meta/{key}.json     # url, validators (ETag/Last-Modified), body hash, timestamps
+    blobs/{sha256}.gz   # gzip-compressed bodies, content-addressed
+
+Entries are revalidated with If-None-Match / If-Modified-Since, so an
+unchanged page costs a 304 instead of a full download. In offline mode the
+cache is replayed without touching the network.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from config import CACHE_DIR, CACHE_MAX_AGE_DAYS, CACHE_MAX_BYTES
+
+# Response headers worth keeping for replay
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Unique per thread too: two fetch threads may store the same blob
+    tmp = path.with_suffix(path.suffix + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class ResponseCache:
+    """Content-addressed response cache with conditional revalidation."""
+
+    def __init__(self, root: Path = CACHE_DIR, offline: bool = False):
+        self.root = root
+        self.offline = offline
+        self.meta_dir = root / "meta"
+        self.blob_dir = root / "blobs"
+        self.meta_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(method: str, url: str, params=None, data=None, json_body=None) -> str:
+        """Cache key for a request: method + URL + query params + body
+        (form fields, raw str/bytes, or a JSON payload)."""
+        parts = [method.upper(), url]
+        if params:
+            parts.append(urlencode(sorted(dict(params).items())))
+        if isinstance(data, bytes):
+            parts.append(hashlib.sha256(data).hexdigest())
+        elif isinstance(data, str):
+            parts.append(hashlib.sha256(data.encode()).hexdigest())
+        elif data:
+            parts.append(urlencode(sorted(dict(data).items())))
+        if json_body is not None:
+            parts.append(json.dumps(json_body, sort_keys=True, default=str))
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        """Load an entry's metadata, or None if missing/corrupt."""
+        path = self.meta_dir / f"{key}.json"
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not (self.blob_dir / f"{entry.get('body_sha', '')}.gz").exists():
+            return None
+        return entry
+
+    def validators(self, entry: dict) -> dict:
+        """Conditional request headers for revalidating an entry."""
+        headers = {}
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def put(self, key: str, resp: requests.Response) -> None:
+        """Store a 200 response."""
+        body = resp.content
+        body_sha = hashlib.sha256(body).hexdigest()
+        blob = self.blob_dir / f"{body_sha}.gz"
+        if not blob.exists():
+            _write_atomic(blob, gzip.compress(body))
+
+        now = time.time()
+        entry = {
+            "url": resp.url,
+            "status": resp.status_code,
+            "encoding": resp.encoding,
+            "headers": {h: resp.headers[h] for h in KEPT_HEADERS if h in resp.headers},
+            "body_sha": body_sha,
+            "fetched_at": now,
+            "validated_at": now,
+        }
+        _write_atomic(self.meta_dir / f"{key}.json", json.dumps(entry).encode())
+
+    def touch(self, key: str, entry: dict) -> None:
+        """Mark an entry as still valid (after a 304)."""
+        entry["validated_at"] = time.time()
+        _write_atomic(self.meta_dir / f"{key}.json", json.dumps(entry).encode())
+
+    def to_response(self, entry: dict) -> requests.Response:
+        """Rebuild a requests.Response from a cache entry."""
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.url = entry["url"]
+        resp.headers = CaseInsensitiveDict(entry["headers"])
+        resp.encoding = entry.get("encoding")
+        resp._content = gzip.decompress((self.blob_dir / f"{entry['body_sha']}.gz").read_bytes())
+        return resp
+
+    def evict(
+        self,
+        max_age_days: float = CACHE_MAX_AGE_DAYS,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ) -> int:
+        """Drop stale entries, then oldest entries until under `max_bytes`.
+
+        Blobs no longer referenced by any entry are deleted. Returns the
+        number of entries removed.
+        """
+        cutoff = time.time() - max_age_days * 86400
+        entries = []
+        removed = 0
+        for path in self.meta_dir.glob("*.json"):
+            try:
+                entry = json.loads(path.read_text())
+            except (OSError, json.JSONDecodeError):
+                path.unlink(missing_ok=True)
+                removed += 1
+                continue
+            if entry.get("validated_at", 0) < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((entry.get("validated_at", 0), path, entry.get("body_sha")))
+
+        blob_sizes = {p.stem: p.stat().st_size for p in self.blob_dir.glob("*.gz")}
+
+        # Oldest first; drop until the referenced blobs fit
+        entries.sort()
+        live_refs: dict[str, int] = {}
+        for _, _, sha in entries:
+            live_refs[sha] = live_refs.get(sha, 0) + 1
+        total = sum(blob_sizes.get(sha, 0) for sha in live_refs)
+        for _, path, sha in entries:
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            removed += 1
+            live_refs[sha] -= 1
+            if live_refs[sha] == 0:
+                del live_refs[sha]
+                total -= blob_sizes.get(sha, 0)
+
+        for sha in blob_sizes:
+            if sha not in live_refs:
+                (self.blob_dir / f"{sha}.gz").unlink(missing_ok=True)
+
+        return removed
@@ -0,0 +1,95 @@
+"""
+Append-only checkpoints for long-running scrape phases.
+
+Each completed record is appended to data/checkpoints/{name}.jsonl as soon
+as it is scraped. If the run dies, the next run with the same name loads
+the file and skips slugs that are already done. The checkpoint is removed
+once the raw output has been written.
+
+A sidecar {name}.run.json records which run wrote the checkpoint (a key
+over its states and mode) and when it started. A checkpoint from a
+different run, or older than CHECKPOINT_MAX_AGE_DAYS, is discarded rather
+than resumed: its records would otherwise be stamped as freshly fetched.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+from config import CHECKPOINT_DIR, CHECKPOINT_MAX_AGE_DAYS
+from scrapers.manifest import content_hash
+
+
+class Checkpoint:
+    """JSONL file of completed records, keyed by slug."""
+
+    def __init__(self, name: str, key_data=None, max_age_days: float = CHECKPOINT_MAX_AGE_DAYS):
+        """
+        Args:
+            name: File name stem, unique per source and batch.
+            key_data: JSON-serializable description of the run (e.g. states
+                and incremental mode); only a run with the same key resumes.
+            max_age_days: Discard checkpoints whose run started longer ago.
+        """
+        self.path = CHECKPOINT_DIR / f"{name}.jsonl"
+        self.run_path = CHECKPOINT_DIR / f"{name}.run.json"
+        self.key = content_hash(key_data)
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _resumable(self) -> bool:
+        """True if the sidecar matches this run; otherwise start a new one."""
+        try:
+            with open(self.run_path) as f:
+                run = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            run = {}
+
+        age_days = (time.time() - run.get("started", 0)) / 86400
+        if run.get("key") == self.key and age_days <= self.max_age_days:
+            return True
+
+        if self.path.exists():
+            reason = "stale" if run.get("key") == self.key else "from a different run"
+            print(f"  Discarding {self.path.name} ({reason})")
+            self.path.unlink()
+        with open(self.run_path, "w") as f:
+            json.dump({"key": self.key, "started": time.time()}, f)
+        return False
+
+    def load(self) -> dict[str, dict]:
+        """Records completed by a previous (interrupted) run of the same key."""
+        done = {}
+        if not self._resumable() or not self.path.exists():
+            return done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from a crash
+                done[record["slug"]] = record
+        if done:
+            print(f"  Resuming: {len(done)} records from {self.path.name}")
+        return done
+
+    def append(self, record: dict) -> None:
+        """Persist one completed record (thread-safe)."""
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+
+    def clear(self) -> None:
+        """Remove the checkpoint after a successful run."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.path.unlink(missing_ok=True)
+        self.run_path.unlink(missing_ok=True)
@@ -0,0 +1,204 @@
+"""
+Shared HTTP client for all scrapers.
+
+Every scraper gets its session from `get_session()`, which provides:
+- a connection pool sized for concurrent fetches, with keep-alive
+- a per-host adaptive rate limiter shared across all sessions
+- exponential backoff with jitter on 429/5xx and connection errors,
+  honouring `Retry-After`
+- an on-disk response cache with conditional revalidation (see cache.py),
+  replayable offline via `configure_cache(offline=True)`
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    USER_AGENT, MAX_CONCURRENCY_PER_HOST,
+    MAX_REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND,
+    MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX,
+)
+from scrapers.cache import ResponseCache
+from scrapers.throttle import AdaptiveRateLimiter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One limiter per host, shared by every session in the process
+_limiters: dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# Fraction of the per-host budget this process may use (see set_rate_share)
+_rate_share = 1.0
+
+# Response cache shared by every session; None disables caching
+_cache: ResponseCache | None = None
+_cache_enabled = True
+
+
+def set_rate_share(share: float) -> None:
+    """Limit this process to `share` of each host's rate budget.
+
+    Used by sharded scrapes so N worker processes together stay within
+    MAX_REQUESTS_PER_SECOND per host.
+    """
+    global _rate_share
+    with _limiters_lock:
+        _rate_share = share
+        _limiters.clear()
+
+
+def host_limiter(host: str) -> AdaptiveRateLimiter:
+    """Get (or create) the rate limiter for a host."""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = AdaptiveRateLimiter(
+                max_rate=MAX_REQUESTS_PER_SECOND * _rate_share,
+                min_rate=MIN_REQUESTS_PER_SECOND * _rate_share,
+            )
+        return _limiters[host]
+
+
+def _retry_after_seconds(resp: requests.Response) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP date)."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def configure_cache(enabled: bool = True, offline: bool = False) -> ResponseCache | None:
+    """Enable/disable the shared response cache, or switch it to offline replay."""
+    global _cache, _cache_enabled
+    _cache_enabled = enabled or offline
+    if not _cache_enabled:
+        _cache = None
+        return None
+    if _cache is None:
+        _cache = ResponseCache()
+    _cache.offline = offline
+    return _cache
+
+
+def response_cache() -> ResponseCache | None:
+    """The shared response cache (created on first use), or None if disabled."""
+    if _cache is None and _cache_enabled:
+        return configure_cache()
+    return _cache
+
+
+class ScraperSession(requests.Session):
+    """requests.Session with per-host rate limiting, retries and caching."""
+
+    def __init__(self, max_retries: int = MAX_RETRIES, cache: ResponseCache | None = None):
+        super().__init__()
+        self.max_retries = max_retries
+        self.cache = cache
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        cache = self.cache
+        # File uploads and streamed bodies can't be keyed; never cache them
+        data = kwargs.get("data")
+        uncacheable = kwargs.get("files") or not (data is None or isinstance(data, (str, bytes, dict, list, tuple)))
+        if cache is None or method.upper() not in ("GET", "POST") or args or uncacheable:
+            return self._request_with_retries(method, url, *args, **kwargs)
+
+        key = cache.key(method, url, kwargs.get("params"), data, kwargs.get("json"))
+        entry = cache.get(key)
+
+        if cache.offline:
+            if entry is None:
+                raise requests.ConnectionError(f"Offline: {method} {url} is not cached")
+            return cache.to_response(entry)
+
+        if entry is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **cache.validators(entry)}
+
+        resp = self._request_with_retries(method, url, **kwargs)
+
+        if resp.status_code == 304 and entry is not None:
+            cache.touch(key, entry)
+            return cache.to_response(entry)
+        if resp.status_code == 200:
+            cache.put(key, resp)
+        return resp
+
+    def _request_with_retries(self, method, url, *args, **kwargs) -> requests.Response:
+        limiter = host_limiter(urlsplit(url).netloc)
+
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                resp = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                limiter.on_pushback()
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(_backoff_seconds(attempt))
+                continue
+
+            if resp.status_code not in RETRY_STATUSES:
+                limiter.on_success()
+                return resp
+
+            limiter.on_pushback()
+            if attempt == self.max_retries:
+                return resp
+
+            wait = _retry_after_seconds(resp)
+            if wait is None:
+                wait = _backoff_seconds(attempt)
+            resp.close()
+            time.sleep(min(wait, BACKOFF_MAX))
+
+        return resp
+
+
+def get_session(
+    headers: dict | None = None,
+    pool_size: int = MAX_CONCURRENCY_PER_HOST,
+    verify: bool = True,
+    cache: bool = True,
+) -> ScraperSession:
+    """Build a pooled, rate-limited, retrying session for a scraper.
+
+    Args:
+        headers: Extra headers on top of the default User-Agent.
+        pool_size: Max pooled keep-alive connections per host.
+        verify: TLS certificate verification.
+        cache: Use the shared HTTP response cache (off for APIs whose
+            results are cached elsewhere, or whose POSTs upload files).
+    """
+    s = ScraperSession(cache=response_cache() if cache else None)
+    s.headers.update({"User-Agent": USER_AGENT})
+    if headers:
+        s.headers.update(headers)
+    s.verify = verify
+
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
@@ -7,13 +7,15 @@ Parses the HTML list directly — no API calls needed.
 
 from __future__ import annotations
 
-import json
 import re
 
 import requests
 from bs4 import BeautifulSoup
 
-from config import USER_AGENT, RAW_DIR
+from config import RAW_DIR
+from pipeline.stream import write_jsonl
+from scrapers.client import get_session
+from scrapers.manifest import Manifest, save_delta
 
 BASE_URL = "https://graciebarra.com"
 SOURCE_NAME = "gracie_barra"
@@ -37,13 +39,10 @@ STATE_TO_CODE = {
 
 
 def _get_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({
-        "User-Agent": USER_AGENT,
+    return get_session({
         "Accept": "text/html,application/xhtml+xml",
         "Accept-Language": "en-US,en;q=0.9",
     })
-    return s
 
 
 def _parse_address(address_text: str) -> dict:
@@ -177,9 +176,13 @@ def run() -> list[dict]:
             unique.append(g)
 
     # Save
-    output_file = RAW_DIR / "gracie_barra.json"
-    with open(output_file, "w") as f:
-        json.dump(unique, f, indent=2)
+    output_file = RAW_DIR / "gracie_barra.jsonl"
+    write_jsonl(output_file, unique)
+
+    manifest = Manifest(SOURCE_NAME)
+    delta = [g for g in unique if manifest.update(g["slug"], g)]
+    manifest.save()
+    save_delta(SOURCE_NAME, delta)
 
     print(f"Done! {len(unique)} US Gracie Barra schools saved to {output_file}")
     return unique
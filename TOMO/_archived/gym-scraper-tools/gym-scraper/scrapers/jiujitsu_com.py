@@ -7,15 +7,19 @@ City pages have name/address/phone. Detail pages add coordinates + website.
 
 from __future__ import annotations
 
-import json
 import re
-import time
+from pathlib import Path
 
 import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 
-from config import US_STATES, REQUEST_DELAY, USER_AGENT, RAW_DIR
+from config import US_STATES, RAW_DIR, DELTA_DIR
+from pipeline.stream import write_jsonl
+from scrapers.checkpoint import Checkpoint
+from scrapers.client import get_session
+from scrapers.manifest import Manifest, save_delta
+from scrapers.throttle import fetch_concurrently
 
 BASE_URL = "https://gyms.jiujitsu.com"
 SOURCE_NAME = "jiujitsu_com"
@@ -39,9 +43,7 @@ STATE_NAMES = {
 
 
 def _get_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({"User-Agent": USER_AGENT})
-    return s
+    return get_session()
 
 
 def scrape_state_cities(session: requests.Session, state_code: str) -> list[str]:
@@ -123,8 +125,12 @@ def scrape_city_page(session: requests.Session, city_url: str) -> list[dict]:
     return gyms
 
 
-def scrape_gym_detail(session: requests.Session, gym: dict) -> dict:
-    """Scrape individual gym page for coordinates and website."""
+def scrape_gym_detail(session: requests.Session, gym: dict) -> dict | None:
+    """Scrape individual gym page for coordinates and website.
+
+    Fills `gym` in place and returns it, or returns None if the page
+    couldn't be fetched.
+    """
     url = gym.get("detail_url", "")
     if not url:
         return gym
@@ -132,8 +138,9 @@ def scrape_gym_detail(session: requests.Session, gym: dict) -> dict:
     try:
         resp = session.get(url, timeout=30)
         resp.raise_for_status()
-    except requests.RequestException:
-        return gym
+    except requests.RequestException as e:
+        print(f"  [WARN] Failed to fetch {gym.get('slug')}: {e}")
+        return None
 
     soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -214,14 +221,26 @@ def _parse_address(address_raw: str) -> dict:
     return result
 
 
-def run(states: list[str] | None = None, fetch_details: bool = True) -> list[dict]:
+def run(
+    states: list[str] | None = None,
+    fetch_details: bool = True,
+    incremental: bool = False,
+    output_file: Path | None = None,
+    delta_dir: Path = DELTA_DIR,
+) -> list[dict]:
     """Run the jiujitsu.com scrape.
 
     Args:
         states: State codes to scrape. Defaults to all US states.
         fetch_details: If True, fetch individual gym pages for coords/website.
+        incremental: Only fetch detail pages for new, changed or stale
+            slugs; reuse the manifest's records for the rest.
+        output_file: Where to write raw output. Defaults to a batch-labelled
+            file in RAW_DIR.
+        delta_dir: Where to write new/changed records.
     """
     states = states or US_STATES
+    batch_label = "_".join(states[:4]) if len(states) <= 4 else f"{states[0]}_{len(states)}states"
     session = _get_session()
     all_gyms = []
 
@@ -235,15 +254,14 @@ def run(states: list[str] | None = None, fetch_details: bool = True) -> list[dic
         all_city_urls.extend(city_urls)
         if city_urls:
             tqdm.write(f"  {state}: {len(city_urls)} cities")
-        time.sleep(REQUEST_DELAY * 0.3)
 
     print(f"\nFound {len(all_city_urls)} city pages")
 
     # Phase 2: Scrape each city page
-    for city_url in tqdm(all_city_urls, desc="City pages"):
-        gyms = scrape_city_page(session, city_url)
+    for gyms in fetch_concurrently(
+        lambda url: scrape_city_page(session, url), all_city_urls, desc="City pages", default=[]
+    ):
         all_gyms.extend(gyms)
-        time.sleep(REQUEST_DELAY * 0.3)
 
     # Dedupe by slug
     seen = set()
@@ -256,20 +274,61 @@ def run(states: list[str] | None = None, fetch_details: bool = True) -> list[dic
     print(f"\nFound {len(unique_gyms)} unique gyms")
 
     # Phase 3: Optionally fetch detail pages for coords + website
+    delta = unique_gyms
     if fetch_details:
-        print("Fetching detail pages for coordinates + website...\n")
-        for gym in tqdm(unique_gyms, desc="Gym details"):
-            scrape_gym_detail(session, gym)
+        manifest = Manifest(SOURCE_NAME)
+        checkpoint = Checkpoint(f"jiujitsu_com_{batch_label}", key_data=[states, incremental])
+        listings = {g["slug"]: dict(g) for g in unique_gyms}
+        to_fetch = [
+            g for g in unique_gyms
+            if not incremental or manifest.needs_fetch(g["slug"], listings[g["slug"]])
+        ]
+
+        # Skip detail pages already completed by an interrupted run
+        done = checkpoint.load()
+        remaining = [g for g in to_fetch if g["slug"] not in done]
+
+        def _clean(gym: dict) -> dict:
             # Clean up internal fields
             gym.pop("detail_url", None)
             gym.pop("address_raw", None)
-            time.sleep(REQUEST_DELAY)
+            return gym
+
+        def _fetch(gym: dict) -> bool:
+            if scrape_gym_detail(session, gym) is None:
+                return False
+            checkpoint.append(_clean(gym))
+            return True
+
+        print(f"Fetching {len(remaining)} detail pages for coordinates + website...\n")
+        ok = fetch_concurrently(_fetch, remaining, desc="Gym details", default=False)
+        # Failed pages are neither checkpointed nor stamped as fetched in the
+        # manifest, so the next run retries them
+        failed = {g["slug"] for g, fetched_ok in zip(remaining, ok) if not fetched_ok}
+        if failed:
+            print(f"  {len(failed)} detail pages failed; keeping their last good record")
+
+        delta = []
+        fetched = {g["slug"] for g in to_fetch} - failed
+        for i, gym in enumerate(unique_gyms):
+            if gym["slug"] not in fetched:
+                cached = manifest.cached_record(gym["slug"])
+                unique_gyms[i] = cached or _clean(dict(listings[gym["slug"]]))
+                continue
+            if gym["slug"] in done:
+                gym = unique_gyms[i] = done[gym["slug"]]
+            if manifest.update(gym["slug"], gym, listings[gym["slug"]]):
+                delta.append(gym)
+        manifest.save()
 
     # Save
-    batch_label = "_".join(states[:4]) if len(states) <= 4 else f"{states[0]}_{len(states)}states"
-    output_file = RAW_DIR / f"jiujitsu_com_{batch_label}.json"
-    with open(output_file, "w") as f:
-        json.dump(unique_gyms, f, indent=2)
+    if output_file is None:
+        output_file = RAW_DIR / f"jiujitsu_com_{batch_label}.jsonl"
+    write_jsonl(output_file, unique_gyms)
+    if fetch_details:
+        checkpoint.clear()
+
+    save_delta(output_file.stem, delta, delta_dir)
 
     print(f"\nDone! {len(unique_gyms)} gyms saved to {output_file}")
     return unique_gyms
@@ -0,0 +1,106 @@
+"""
+Per-source change manifests for incremental scraping.
+
+Each source keeps data/manifests/{source}.json mapping slug → listing hash,
+record hash, last parsed record and timestamps. Incremental runs only fetch
+detail pages for slugs that are new, whose listing changed, or that have not
+been refreshed within MANIFEST_REFRESH_DAYS. Records that are new or changed
+are written to data/delta/ for `run.py process --delta`.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from config import MANIFEST_DIR, DELTA_DIR, MANIFEST_REFRESH_DAYS
+from pipeline.stream import write_jsonl
+
+
+def content_hash(obj) -> str:
+    """Stable hash of a JSON-serializable value."""
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Manifest:
+    """Slugs seen for one source, with content hashes and timestamps."""
+
+    def __init__(self, source: str, refresh_days: float = MANIFEST_REFRESH_DAYS):
+        self.source = source
+        self.refresh_seconds = refresh_days * 86400
+        self.path = MANIFEST_DIR / f"{source}.json"
+        self.now = time.time()
+        self.entries = self._load()
+        self._touched: set[str] = set()
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def needs_fetch(self, slug: str, listing: dict | None = None) -> bool:
+        """True if the slug is new, its listing changed, or it is stale."""
+        entry = self.entries.get(slug)
+        if not entry or entry.get("record") is None:
+            return True
+        if listing is not None and entry.get("listing_hash") != content_hash(listing):
+            return True
+        return self.now - entry.get("last_fetched", 0) > self.refresh_seconds
+
+    def cached_record(self, slug: str) -> dict | None:
+        """Last parsed record for a slug, marking it as seen this run."""
+        entry = self.entries.get(slug)
+        if not entry:
+            return None
+        entry["last_seen"] = self.now
+        self._touched.add(slug)
+        return entry.get("record")
+
+    def update(self, slug: str, record: dict, listing: dict | None = None) -> bool:
+        """Store a freshly scraped record. Returns True if it is new or changed."""
+        entry = self.entries.setdefault(slug, {"first_seen": self.now})
+        record_hash = content_hash(record)
+        changed = entry.get("record_hash") != record_hash
+
+        entry.update({
+            "record_hash": record_hash,
+            "record": record,
+            "last_seen": self.now,
+            "last_fetched": self.now,
+        })
+        if listing is not None:
+            entry["listing_hash"] = content_hash(listing)
+        self._touched.add(slug)
+        return changed
+
+    def save(self) -> None:
+        """Write this run's entries back, merged with any concurrent writers.
+
+        Parallel shard workers share one manifest per source, so the file is
+        re-read under a lock and only the slugs touched here are overlaid.
+        """
+        with open(self.path.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self._load()
+            for slug in self._touched:
+                entries[slug] = self.entries[slug]
+            tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        self.entries = entries
+        self._touched.clear()
+
+
+def save_delta(name: str, records: list[dict], directory: Path = DELTA_DIR) -> None:
+    """Write new/changed records for `run.py process --delta`."""
+    directory.mkdir(parents=True, exist_ok=True)
+    output_file = directory / f"{name}.jsonl"
+    write_jsonl(output_file, records)
+    print(f"  Delta: {len(records)} new/changed gyms saved to {output_file}")
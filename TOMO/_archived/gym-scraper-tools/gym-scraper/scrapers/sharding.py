@@ -0,0 +1,189 @@
+"""
+Parallel per-state sharded scraping.
+
+Splits the state list into fixed-size shards and runs them in a process
+pool. Each shard writes data/shards/{source}/{shard}.jsonl atomically, so a
+rerun after a crash skips shards that already finished. Once every shard is
+done, the outputs are merged (deduped by slug) into the same raw file an
+unsharded run would produce.
+
+Shards are only reused by the run that wrote them: data/shards/{source}/
+run.json records what the run scrapes and when it started, and a run with
+different states or mode, or older than MANIFEST_REFRESH_DAYS, starts over.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from config import DATA_DIR, RAW_DIR, DELTA_DIR, MANIFEST_REFRESH_DAYS
+from pipeline.stream import iter_records, write_jsonl
+from scrapers.manifest import content_hash
+
+SHARD_DIR = DATA_DIR / "shards"
+SHARD_SIZE = 4  # states per shard — small enough that a crash loses little work
+
+# Sources that crawl per-state, mapped to their raw file prefix
+SHARDABLE_SOURCES = {
+    "bjjmetrics": "bjjmetrics",
+    "jiujitsu": "jiujitsu_com",
+}
+
+
+def _batch_label(states: list[str]) -> str:
+    """Same raw-file label the scrapers use for an unsharded run."""
+    return "_".join(states[:4]) if len(states) <= 4 else f"{states[0]}_{len(states)}states"
+
+
+def _shards(states: list[str]) -> list[list[str]]:
+    return [states[i : i + SHARD_SIZE] for i in range(0, len(states), SHARD_SIZE)]
+
+
+def _start_run(shard_dir: Path, states: list[str], incremental: bool) -> bool:
+    """Prepare a source's shard directory; returns True if resuming a run.
+
+    Shards are kept only if run.json describes the same states and mode
+    and is younger than MANIFEST_REFRESH_DAYS. Otherwise the directory is
+    cleared and a new run.json is written. Temp files left by workers
+    that died mid-write are removed either way.
+    """
+    run_file = shard_dir / "run.json"
+    key = content_hash([states, incremental])
+    try:
+        with open(run_file) as f:
+            run = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        run = {}
+
+    age_days = (time.time() - run.get("started", 0)) / 86400
+    resume = run.get("key") == key and age_days <= MANIFEST_REFRESH_DAYS
+    if not resume:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        (shard_dir / "delta").mkdir(parents=True)
+        with open(run_file, "w") as f:
+            json.dump({"key": key, "started": time.time()}, f)
+        return False
+
+    for tmp in shard_dir.glob("**/*.tmp"):
+        if tmp.is_dir():
+            shutil.rmtree(tmp)
+        else:
+            tmp.unlink(missing_ok=True)
+    (shard_dir / "delta").mkdir(exist_ok=True)
+    return True
+
+
+def _init_worker(rate_share: float, use_cache: bool, offline: bool) -> None:
+    from scrapers.client import configure_cache, set_rate_share
+    set_rate_share(rate_share)
+    configure_cache(enabled=use_cache, offline=offline)
+
+
+def _run_shard(source: str, states: list[str], shard_dir: Path, incremental: bool) -> int:
+    """Scrape one shard in a worker process; returns the record count."""
+    if source == "bjjmetrics":
+        from scrapers.bjjmetrics import run as source_run
+    else:
+        from scrapers.jiujitsu_com import run as source_run
+
+    shard_file = shard_dir / f"{'_'.join(states)}.jsonl"
+    tmp_file = shard_file.with_suffix(f".{os.getpid()}.tmp")
+    tmp_delta = shard_dir / f"delta.{os.getpid()}.tmp"
+    gyms = source_run(
+        states=states,
+        incremental=incremental,
+        output_file=tmp_file,
+        delta_dir=tmp_delta,
+    )
+    # Delta first: the shard file marks the shard as done
+    delta_file = tmp_delta / f"{tmp_file.stem}.jsonl"
+    if delta_file.exists():
+        os.replace(delta_file, shard_dir / "delta" / shard_file.name)
+    shutil.rmtree(tmp_delta, ignore_errors=True)
+    os.replace(tmp_file, shard_file)
+    return len(gyms)
+
+
+def _merge_shards(files: list[Path], output_file: Path) -> int:
+    """Stream shard files into one JSONL file, deduped by slug, atomically."""
+    seen = set()
+
+    def _unique():
+        for path in files:
+            for gym in iter_records(path):
+                if gym["slug"] not in seen:
+                    seen.add(gym["slug"])
+                    yield gym
+
+    return write_jsonl(output_file, _unique())
+
+
+def run_sharded(
+    source_states: dict[str, list[str]],
+    workers: int,
+    incremental: bool = False,
+    use_cache: bool = True,
+    offline: bool = False,
+) -> None:
+    """Scrape each source over its states in `workers` processes.
+
+    The per-host rate budget is split evenly across workers. Shards left
+    over from an interrupted run of the same states and mode are reused
+    (see `_start_run`); a failed shard leaves the others in place so the
+    next run resumes from there.
+
+    Args:
+        source_states: Source name ("bjjmetrics"/"jiujitsu") → state codes.
+        workers: Number of worker processes.
+    """
+    jobs = []
+    for source, states in source_states.items():
+        shard_dir = SHARD_DIR / SHARDABLE_SOURCES[source]
+        resume = _start_run(shard_dir, states, incremental)
+        for shard in _shards(states):
+            if resume and (shard_dir / f"{'_'.join(shard)}.jsonl").exists():
+                print(f"  [resume] {source} {'_'.join(shard)} already done")
+                continue
+            jobs.append((source, shard, shard_dir))
+
+    print(f"\n=== Sharded scrape: {len(jobs)} shards on {workers} workers ===")
+
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(1.0 / workers, use_cache, offline),
+    ) as pool:
+        futures = {
+            pool.submit(_run_shard, source, shard, shard_dir, incremental): (source, shard)
+            for source, shard, shard_dir in jobs
+        }
+        for future in as_completed(futures):
+            source, shard = futures[future]
+            try:
+                count = future.result()
+                print(f"  [done] {source} {'_'.join(shard)}: {count} gyms")
+            except Exception as e:
+                failed.append(source)
+                print(f"  [FAILED] {source} {'_'.join(shard)}: {e}")
+
+    for source, states in source_states.items():
+        prefix = SHARDABLE_SOURCES[source]
+        if source in failed:
+            print(f"  {source}: shards incomplete, rerun to resume")
+            continue
+
+        shard_dir = SHARD_DIR / prefix
+        shard_files = [shard_dir / f"{'_'.join(s)}.jsonl" for s in _shards(states)]
+        delta_files = sorted((shard_dir / "delta").glob("*.jsonl"))
+        output_file = RAW_DIR / f"{prefix}_{_batch_label(states)}.jsonl"
+
+        count = _merge_shards(shard_files, output_file)
+        _merge_shards(delta_files, DELTA_DIR / output_file.name)
+        shutil.rmtree(shard_dir)
+        print(f"  {source}: merged {count} gyms into {output_file}")
@@ -9,24 +9,23 @@ from __future__ import annotations
 
 import json
 import re
-import time
 
 import requests
 from bs4 import BeautifulSoup
-from tqdm import tqdm
 
-from config import USER_AGENT, RAW_DIR
+from config import RAW_DIR
+from pipeline.stream import write_jsonl
+from scrapers.client import get_session
+from scrapers.manifest import Manifest, save_delta
+from scrapers.throttle import fetch_concurrently
 
 BASE_URL = "https://10thplanetjj.com"
 SOURCE_NAME = "10thplanet"
 
 
 def _get_session() -> requests.Session:
-    s = requests.Session()
-    s.headers.update({"User-Agent": USER_AGENT})
     # 10th Planet has TLS cert issues, skip verification
-    s.verify = False
-    return s
+    return get_session(verify=False)
 
 
 def run() -> list[dict]:
@@ -103,12 +102,12 @@ def run() -> list[dict]:
             if href not in location_links and "/locations/" != href.rstrip("/"):
                 location_links.add(href)
 
-        for href in tqdm(list(location_links), desc="Location pages"):
-            full_url = href if href.startswith("http") else BASE_URL + href
-            gym = _scrape_location_page(session, full_url)
+        full_urls = [href if href.startswith("http") else BASE_URL + href for href in location_links]
+        for gym in fetch_concurrently(
+            lambda url: _scrape_location_page(session, url), full_urls, desc="Location pages"
+        ):
             if gym:
                 gyms.append(gym)
-            time.sleep(1.0)
 
     # Tag all as 10th Planet affiliation
     for gym in gyms:
@@ -116,9 +115,13 @@ def run() -> list[dict]:
         gym["source"] = SOURCE_NAME
 
     # Save
-    output_file = RAW_DIR / "10thplanet.json"
-    with open(output_file, "w") as f:
-        json.dump(gyms, f, indent=2)
+    output_file = RAW_DIR / "10thplanet.jsonl"
+    write_jsonl(output_file, gyms)
+
+    manifest = Manifest(SOURCE_NAME)
+    delta = [g for g in gyms if manifest.update(g["slug"], g)]
+    manifest.save()
+    save_delta(SOURCE_NAME, delta)
 
     print(f"\nDone! {len(gyms)} gyms saved to {output_file}")
     return gyms
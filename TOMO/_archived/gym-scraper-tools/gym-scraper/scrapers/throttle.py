@@ -0,0 +1,154 @@
+"""
+Concurrency helpers for scrapers.
+
+A token-bucket rate limiter plus a bounded thread pool, so the politeness
+budget is spent on parallel in-flight requests instead of fixed sleeps, and
+a latency recorder for tuning those budgets.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, TypeVar
+
+from tqdm import tqdm
+
+from config import MAX_CONCURRENCY_PER_HOST, MAX_REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    `acquire()` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float = MAX_REQUESTS_PER_SECOND, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate reacts to how the host is coping.
+
+    Pushback (429/5xx) halves the rate down to `min_rate`; each success
+    nudges it back up towards `max_rate` (AIMD).
+    """
+
+    def __init__(
+        self,
+        max_rate: float = MAX_REQUESTS_PER_SECOND,
+        min_rate: float = MIN_REQUESTS_PER_SECOND,
+    ):
+        super().__init__(max_rate)
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+    def on_pushback(self) -> None:
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class LatencyStats:
+    """Thread-safe record of request latencies and errors."""
+
+    def __init__(self):
+        self.errors = 0
+        self._samples: list[float] = []
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile (0-100) of recorded latencies, in seconds."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        rank = max(0, math.ceil(p / 100 * len(samples)) - 1)
+        return samples[rank]
+
+    def summary(self) -> str:
+        count = len(self._samples)
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return (
+            f"{count} requests in {elapsed:.1f}s ({count / elapsed:.2f}/s), "
+            f"latency p50 {self.percentile(50):.2f}s / p90 {self.percentile(90):.2f}s / "
+            f"p99 {self.percentile(99):.2f}s, {self.errors} errors"
+        )
+
+
+def fetch_concurrently(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = MAX_CONCURRENCY_PER_HOST,
+    limiter: TokenBucket | None = None,
+    desc: str = "Fetching",
+    default=None,
+) -> list[R]:
+    """Run `func` over `items` on a bounded thread pool.
+
+    Each call first takes a token from `limiter` (if given). Results are
+    returned in input order regardless of completion order. An item whose
+    call raises is logged and gets `default`, so one bad page (or parser
+    bug) doesn't abort the rest; failures are counted at the end.
+    """
+    items = list(items)
+    results: list = [default] * len(items)
+    failures = 0
+
+    def _call(item: T) -> R:
+        if limiter is not None:
+            limiter.acquire()
+        return func(item)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(_call, item): i for i, item in enumerate(items)}
+        for future in tqdm(as_completed(futures), total=len(futures), desc=desc):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                failures += 1
+                tqdm.write(f"  [ERROR] {desc}: {str(items[i])[:80]}: {type(e).__name__}: {e}")
+
+    if failures:
+        print(f"  {desc}: {failures} of {len(items)} failed")
+    return results
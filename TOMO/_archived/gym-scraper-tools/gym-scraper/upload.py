@@ -3,106 +3,434 @@ Upload gym data to Supabase.
 
 Upserts gym records into the `gyms` table using the service_role key.
 Idempotent — safe to run repeatedly.
+
+Records are packed into batches by serialized size and sent by a few
+concurrent requests. A batch rejected for its data (a Postgres 22xxx/23xxx
+error) is split in half and each half retried, so a bad row is isolated in
+O(log n) requests rather than one request per row. Timeouts, dropped
+connections, 429s and 5xx are retried whole with backoff; if they persist,
+or the request is refused outright (auth, schema), the upload stops instead
+of bisecting into a service that is already struggling.
+
+Only rows that changed since the last successful upload are upserted: a
+snapshot of per-slug row hashes (data/upload_snapshot.json) is diffed
+against the new rows, and unchanged ones just get `last_verified` bumped
+with one bulk update per ~4 KB URL of slugs. `--full` ignores the snapshot;
+`--prune` also deletes rows whose slug disappeared.
+
+Any PostgREST-compatible endpoint works as SUPABASE_URL, e.g. the local
+stack from `supabase start` (http://127.0.0.1:54321) for testing.
 """
 
 from __future__ import annotations
 
 import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+from urllib.parse import quote
 
+import httpx
+from postgrest.exceptions import APIError
 from supabase import create_client
 from tqdm import tqdm
 
-from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, READY_DIR
+from config import (
+    SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, READY_DIR,
+    MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX,
+    UPLOAD_SNAPSHOT_PATH, UPLOAD_MAX_DELETE_FRACTION,
+    TABLE_FIELDS,  # re-exported: fields that map directly to the gyms table
+)
+from pipeline.stream import COMPACT_SUFFIX, iter_records
+from scrapers.manifest import content_hash
 
 
-# Fields that map directly to the gyms table
-TABLE_FIELDS = {
-    "name", "slug", "address", "city", "state", "zip",
-    "lat", "lng", "affiliation", "is_headquarters", "website",
-    "phone", "instagram", "rating", "review_count", "styles",
-    "head_instructor", "google_place_id", "sources", "source_ids",
-    "verified", "last_verified",
-}
+BATCH_SIZE = 500  # max rows per upsert request
+BATCH_MAX_BYTES = 256 * 1024  # max serialized payload per upsert request
+UPLOAD_CONCURRENCY = 4  # upsert requests in flight
+SLUG_FILTER_MAX_BYTES = 3500  # encoded `in.(…)` slug filter per touch/delete request, keeps URLs under ~4 KB
 
-BATCH_SIZE = 100
 
+def _prepare_record(gym: dict, in_place: bool = False) -> dict:
+    """Convert a gym dict to a Supabase-ready record.
 
-def _prepare_record(gym: dict) -> dict:
-    """Convert a gym dict to a Supabase-ready record."""
-    record = {}
-    for key in TABLE_FIELDS:
-        if key in gym and gym[key] is not None:
-            record[key] = gym[key]
+    Args:
+        gym: Finalized gym record.
+        in_place: Strip `gym` itself down to the table columns instead of
+            building a new dict (for records nothing else reads afterwards).
+    """
+    source = gym.get("source")
+    if in_place:
+        record = gym
+        for key in [k for k, v in record.items() if k not in TABLE_FIELDS or v is None]:
+            del record[key]
+    else:
+        record = {}
+        for key in TABLE_FIELDS:
+            if key in gym and gym[key] is not None:
+                record[key] = gym[key]
 
     # Ensure sources is a list
     if "sources" not in record:
-        source = gym.get("source")
         record["sources"] = [source] if source else []
 
     # Ensure source_ids is a dict
     if "source_ids" not in record:
         record["source_ids"] = {}
 
+    # Null unless geocoded, so a row whose centroid was replaced by real
+    # coordinates doesn't keep its old precision
+    if "geo_precision" not in record:
+        record["geo_precision"] = None
+
     return record
 
 
-def upload(gyms: list[dict] | None = None, file_path: Path | None = None):
+def _error_code(e: Exception) -> str:
+    """PostgREST/Postgres error code, or the HTTP status for non-JSON errors."""
+    return str(e.code or "") if isinstance(e, APIError) else ""
+
+
+def _is_row_error(e: Exception) -> bool:
+    """True if the rows themselves were rejected (bad value, constraint).
+
+    Only these are worth bisecting: the other half of the batch may be fine.
+    413 is included because a smaller batch is exactly what fixes it.
+    """
+    code = _error_code(e)
+    return code.startswith(("22", "23")) or code == "413"
+
+
+def _is_transient(e: Exception) -> bool:
+    """True for errors that retrying the same request may get past."""
+    if isinstance(e, httpx.TransportError):  # timeouts, resets, refused connections
+        return True
+    code = _error_code(e)
+    return (
+        code in ("408", "429", "40001", "40P01", "57014")  # timeout, rate limit, serialization, deadlock
+        or (code.isdigit() and len(code) == 3 and code.startswith("5"))
+        or code.startswith(("08", "53", "PGRST00"))  # connection, resources, PostgREST → DB
+    )
+
+
+def _payload_size(record: dict) -> int:
+    return len(json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()) + 1
+
+
+class BatchUploader:
+    """Pipelined upserts into the `gyms` table.
+
+    `add()` packs records into batches of at most BATCH_SIZE rows and
+    BATCH_MAX_BYTES of JSON, and hands each full batch to a thread pool.
+    At most 2 × concurrency batches are queued or in flight, so `add()`
+    blocks instead of buffering an unbounded backlog.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int = UPLOAD_CONCURRENCY,
+        max_rows: int = BATCH_SIZE,
+        max_bytes: int = BATCH_MAX_BYTES,
+        total: int | None = None,
+    ):
+        """
+        Args:
+            client: Supabase client (anything with `.table(name).upsert(...)`).
+            concurrency: Upsert requests in flight.
+            max_rows: Row cap per request.
+            max_bytes: Payload cap per request.
+            total: Expected record count, for the progress bar.
+        """
+        self.client = client
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.success = 0
+        self.errors = 0
+        self.aborted: Exception | None = None  # set once a batch fails for good
+        self.requests = 0
+        self.uploaded: list[str] = []  # slugs that made it, for the snapshot
+        self._batch: list[dict] = []
+        self._batch_bytes = 0
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._lock = threading.Lock()
+        self._progress = tqdm(total=total, desc="Uploading", unit="gym")
+
+    def add(self, record: dict) -> None:
+        """Queue one prepared record."""
+        size = _payload_size(record)
+        if self._batch and (len(self._batch) >= self.max_rows or self._batch_bytes + size > self.max_bytes):
+            self.flush()
+        self._batch.append(record)
+        self._batch_bytes += size
+
+    def flush(self) -> None:
+        """Send the current partial batch."""
+        if not self._batch:
+            return
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        self._slots.acquire()
+        future = self._pool.submit(self._send, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def close(self) -> tuple[int, int]:
+        """Flush, wait for every request, and return (success, errors)."""
+        self.flush()
+        self._pool.shutdown(wait=True)
+        self._progress.close()
+        return self.success, self.errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _upsert(self, records: list[dict]) -> None:
+        with self._lock:
+            self.requests += 1
+        # Upsert on slug (unique identifier from source)
+        self.client.table("gyms").upsert(records, on_conflict="slug").execute()
+
+    def _send(self, records: list[dict]) -> None:
+        """Upsert a batch.
+
+        Row-level data errors bisect down to the bad rows. Transient errors
+        retry the whole batch with backoff; when retries run out, or on any
+        other error, the upload is aborted and later batches aren't sent.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            if self.aborted is not None:
+                self._fail(records)
+                return
+            try:
+                self._upsert(records)
+                break
+            except Exception as e:
+                if _is_row_error(e):
+                    if len(records) == 1:
+                        with self._lock:
+                            self.errors += 1
+                        print(f"\n  [SKIP] {records[0].get('name', '?')}: {e}")
+                        self._progress.update(1)
+                        return
+                    mid = len(records) // 2
+                    self._send(records[:mid])
+                    self._send(records[mid:])
+                    return
+                if not _is_transient(e) or attempt == MAX_RETRIES:
+                    self._fail(records, e)
+                    return
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+        with self._lock:
+            self.success += len(records)
+            self.uploaded.extend(r["slug"] for r in records if r.get("slug") is not None)
+        self._progress.update(len(records))
+
+    def _fail(self, records: list[dict], error: Exception | None = None) -> None:
+        """Count a batch as failed; the first failure aborts the upload."""
+        with self._lock:
+            self.errors += len(records)
+            first = error is not None and self.aborted is None
+            if first:
+                self.aborted = error
+        if first:
+            print(f"\n  [ERROR] Upload aborted, remaining batches won't be sent: {type(error).__name__}: {error}")
+        self._progress.update(len(records))
+
+
+def _row_hash(record: dict) -> str:
+    """Hash of a prepared record's content, ignoring `last_verified`."""
+    return content_hash({k: v for k, v in record.items() if k != "last_verified"})
+
+
+class UploadSnapshot:
+    """Row hash per slug as of the last successful upload."""
+
+    def __init__(self, path: Path = UPLOAD_SNAPSHOT_PATH):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.hashes: dict[str, str] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.hashes = {}
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp, self.path)
+
+
+def _slug_chunks(slugs: list[str], max_bytes: int = SLUG_FILTER_MAX_BYTES) -> list[list[str]]:
+    """Split slugs into `in.(…)` filters of at most `max_bytes` once URL-encoded.
+
+    Each slug is costed as if quoted and followed by an encoded comma, so
+    the estimate errs on the long side.
+    """
+    chunks: list[list[str]] = []
+    chunk: list[str] = []
+    size = 0
+    for slug in slugs:
+        cost = len(quote(f'"{slug}"', safe="")) + 3
+        if chunk and size + cost > max_bytes:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(slug)
+        size += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _bulk(action, chunks: list, concurrency: int) -> list:
+    """Run `action(chunk)` over chunks in a thread pool; return the chunks that succeeded."""
+    def attempt(chunk):
+        try:
+            action(chunk)
+            return True
+        except Exception as e:
+            print(f"\n  [ERROR] {len(chunk)} slugs: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [c for c, ok in zip(chunks, pool.map(attempt, chunks)) if ok]
+
+
+def _touch(client, by_timestamp: dict[str, list[str]], concurrency: int) -> int:
+    """Set last_verified on unchanged rows. Returns how many were touched."""
+    chunks = [(ts, chunk) for ts, slugs in by_timestamp.items() for chunk in _slug_chunks(slugs)]
+    done = _bulk(
+        lambda c: client.table("gyms").update({"last_verified": c[0]}).in_("slug", c[1]).execute(),
+        chunks, concurrency,
+    )
+    return sum(len(slugs) for _, slugs in done)
+
+
+def _delete(client, slugs: list[str], concurrency: int) -> list[str]:
+    """Delete rows by slug. Returns the slugs deleted."""
+    done = _bulk(
+        lambda c: client.table("gyms").delete().in_("slug", c).execute(),
+        _slug_chunks(slugs), concurrency,
+    )
+    return [slug for chunk in done for slug in chunk]
+
+
+def upload(
+    gyms: Iterable[dict] | None = None,
+    file_path: Path | None = None,
+    client=None,
+    concurrency: int = UPLOAD_CONCURRENCY,
+    full: bool = False,
+    prune: bool = False,
+    in_place: bool = False,
+    compact: bool = False,
+):
     """Upload gyms to Supabase.
 
+    Records are diffed and queued as they are read, so `gyms` may be a
+    generator (e.g. the streaming process stage): upserts overlap with
+    whatever produces the records, and `BatchUploader` blocks the producer
+    once its queue of batches is full.
+
     Args:
-        gyms: List of gym dicts to upload.
+        gyms: Gym dicts to upload (a list or any iterable).
         file_path: Path to JSON file to load gyms from.
             If neither is provided, loads from data/ready/gyms.json.
+        client: Supabase client to use instead of one built from
+            SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY.
+        concurrency: Upsert requests in flight.
+        full: Upsert every row regardless of the snapshot (and rebuild it).
+        prune: Delete rows uploaded before whose slug is no longer present.
+            Only meaningful for a complete gym set, never a delta.
+        in_place: Strip the gym dicts down to table rows instead of copying.
+        compact: Stream the compact copy next to `file_path` (same name,
+            .msgpack, written by `process --compact`) instead of the JSON.
     """
-    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+    if client is None and (not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY):
         print("ERROR: Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY in .env")
         return
 
     if gyms is None:
         file_path = file_path or READY_DIR / "gyms.json"
+        if compact:
+            file_path = file_path.with_suffix(COMPACT_SUFFIX)
         if not file_path.exists():
             print(f"ERROR: No data file found at {file_path}")
-            print("  Run the scraper first: python run.py scrape")
+            if compact:
+                print("  Write it first: python run.py process --compact")
+            else:
+                print("  Run the scraper first: python run.py scrape")
             return
-        with open(file_path) as f:
-            gyms = json.load(f)
+        if compact:
+            print(f"  Reading {file_path.name}")
+            gyms = iter_records(file_path)
+        else:
+            with open(file_path) as f:
+                gyms = json.load(f)
 
-    print(f"\n=== Uploading {len(gyms)} gyms to Supabase ===\n")
+    count = f" {len(gyms)}" if isinstance(gyms, list) else ""
+    print(f"\n=== Uploading{count} gyms to Supabase ===\n")
 
-    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    client = client or create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    snapshot = UploadSnapshot()
+    previous = {} if full else snapshot.hashes
 
-    success = 0
-    errors = 0
+    # Diff against the snapshot as records arrive; only changed rows are queued
+    new_hashes: dict[str, str] = {}
+    touch: dict[str, list[str]] = defaultdict(list)
+    total = inserted = 0
+    seen = set()
+    uploader = BatchUploader(client, concurrency=concurrency)
+    with uploader:
+        for gym in gyms:
+            total += 1
+            record = _prepare_record(gym, in_place=in_place)
+            slug = record.get("slug")
+            seen.add(slug)
+            old_hash = previous.get(slug)
+            row_hash = _row_hash(record)
+            if slug is None or old_hash != row_hash:
+                inserted += old_hash is None
+                if slug is not None:
+                    new_hashes[slug] = row_hash
+                uploader.add(record)
+            elif record.get("last_verified"):
+                touch[record["last_verified"]].append(slug)
+    for slug in uploader.uploaded:
+        snapshot.hashes[slug] = new_hashes[slug]
 
-    # Upload in batches
-    for i in tqdm(range(0, len(gyms), BATCH_SIZE), desc="Uploading"):
-        batch = gyms[i : i + BATCH_SIZE]
-        records = [_prepare_record(g) for g in batch]
+    changed = uploader.success + uploader.errors
+    unchanged = sum(len(slugs) for slugs in touch.values())
+    deleted = [slug for slug in snapshot.hashes if slug not in seen] if prune else []
+    print(f"  {total} gyms: {inserted} new, {changed - inserted} changed, {unchanged} unchanged, "
+          f"{len(deleted)} to delete")
 
-        try:
-            # Upsert on slug (unique identifier from source)
-            result = (
-                client.table("gyms")
-                .upsert(records, on_conflict="slug")
-                .execute()
-            )
-            success += len(records)
-        except Exception as e:
-            print(f"\n  [ERROR] Batch {i // BATCH_SIZE}: {e}")
-            # Try individual inserts for the failed batch
-            for record in records:
-                try:
-                    client.table("gyms").upsert(
-                        record, on_conflict="slug"
-                    ).execute()
-                    success += 1
-                except Exception as e2:
-                    errors += 1
-                    print(f"  [SKIP] {record.get('name', '?')}: {e2}")
-
-    print(f"\nDone! {success} uploaded, {errors} errors")
+    if uploader.aborted is not None:
+        # The service is down or refusing us; don't follow up with more requests
+        touch, deleted = {}, []
+        print("  [SKIP] Not touching or pruning rows after the aborted upload")
+
+    touched = _touch(client, touch, concurrency) if touch else 0
+
+    removed = []
+    if len(deleted) > UPLOAD_MAX_DELETE_FRACTION * max(len(snapshot.hashes), 1):
+        print(f"  [SKIP] Not pruning {len(deleted)} rows (over {UPLOAD_MAX_DELETE_FRACTION:.0%} of the table)")
+    elif deleted:
+        removed = _delete(client, deleted, concurrency)
+    for slug in removed:
+        snapshot.hashes.pop(slug, None)
+
+    snapshot.save()
+    print(f"\nDone! {uploader.success} uploaded, {uploader.errors} errors, "
+          f"{touched} touched, {len(removed)} deleted ({uploader.requests} upsert requests)")
 
 
 if __name__ == "__main__":
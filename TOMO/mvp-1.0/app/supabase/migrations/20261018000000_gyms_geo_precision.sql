@@ -0,0 +1,13 @@
+-- Migration: Add geo_precision to gyms
+-- Date: 2026-10-18
+--
+-- The gym scraper fills missing coordinates from the Census geocoder or,
+-- failing that, from a ZIP or city centroid. Centroids can be miles off,
+-- so the scraper now uploads how each row's lat/lng was obtained:
+--   'address'  Census geocoder match on the street address
+--   'zip'      ZIP code (ZCTA) centroid
+--   'city'     city/place centroid
+--   NULL       coordinates came from the source listing
+
+ALTER TABLE gyms ADD COLUMN IF NOT EXISTS geo_precision TEXT DEFAULT NULL
+  CHECK (geo_precision IN ('address', 'zip', 'city'));